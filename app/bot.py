@@ -1,16 +1,28 @@
 import asyncio
 import logging
+from datetime import UTC, datetime
 
 from aiogram import Bot, Dispatcher
 from apscheduler.schedulers.asyncio import AsyncIOScheduler  # type: ignore
 from apscheduler.triggers.cron import CronTrigger  # type: ignore
+from apscheduler.triggers.interval import IntervalTrigger  # type: ignore
+from apscheduler.util import undefined  # type: ignore
 from core.config import config
 from core.database import db_manager
 from core.enums import ReportType
 from handlers.registration import register_handlers
+from invest.alert_state import alert_state
+from invest.bond_catalog import bond_catalog
+from invest.bond_events_cache import bond_events_cache
+from invest.price_monitor import price_statistics
+from invest.tbank_client import http_transport, parse_executor
 from services.price_alert_service import PriceAlertService
 from services.report_service import ReportService
+from storage import AlertStorage
+from storage.activity_tracker import activity_tracker
+from storage.cache import log_cache_stats
 from utils.bot_utils import BotUtils
+from utils.loop_monitor import LoopLagMonitor
 
 logging.basicConfig(level=logging.INFO)
 
@@ -21,6 +33,10 @@ dp = Dispatcher()
 async def main():
     """Start the bot."""
     await db_manager.create_tables()
+    await AlertStorage.backfill_latest_prices()
+    await alert_state.load()
+    await price_statistics.load()
+    await bond_catalog.load_snapshot()
     register_handlers(dp, bot)
     await BotUtils.set_commands(bot)
     scheduler = AsyncIOScheduler(timezone="Europe/Moscow")
@@ -44,10 +60,57 @@ async def main():
         kwargs={"bot": bot},
     )
 
+    # Фоновое обновление справочника облигаций (сразу, если снимок устарел)
+    scheduler.add_job(
+        bond_catalog.refresh,
+        IntervalTrigger(hours=config.bond_catalog_refresh_hours),
+        next_run_time=datetime.now(UTC) if bond_catalog.is_stale else undefined,
+    )
+
+    # Ночное обновление кэша событий по облигациям
+    scheduler.add_job(
+        bond_events_cache.refresh_all,
+        CronTrigger(hour=3, minute=0, timezone="Europe/Moscow"),
+    )
+
+    # Секции истории цен и алертов: новые дни заранее, устаревшие - удаляются
+    scheduler.add_job(
+        db_manager.maintain_partitions,
+        CronTrigger(hour=0, minute=5, timezone="UTC"),
+    )
+    scheduler.add_job(
+        AlertStorage.cleanup_stale_prices,
+        CronTrigger(hour=0, minute=10, timezone="UTC"),
+        kwargs={"days_to_keep": config.history_retention_days},
+    )
+
+    # Запись отправленных алертов из памяти в sent_alerts
+    scheduler.add_job(alert_state.flush, IntervalTrigger(seconds=config.alert_state_flush_seconds))
+
+    # Запись времени активности пользователей из памяти в bot_users
+    scheduler.add_job(
+        activity_tracker.flush, IntervalTrigger(seconds=config.activity_flush_seconds)
+    )
+
+    # Статистика кэшей токенов и настроек
+    scheduler.add_job(log_cache_stats, IntervalTrigger(hours=1))
+
     scheduler.start()
 
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    loop_monitor = LoopLagMonitor(report_interval=config.loop_lag_report_seconds)
+    loop_monitor.start()
+
+    try:
+        await bot.delete_webhook(drop_pending_updates=True)
+        await dp.start_polling(bot)
+    finally:
+        scheduler.shutdown(wait=False)
+        await loop_monitor.stop()
+        await alert_state.flush()
+        await activity_tracker.flush()
+        await http_transport.close()
+        parse_executor.shutdown()
+        await db_manager.close()
 
 
 if __name__ == "__main__":
@@ -1,8 +1,11 @@
 """Настройка подключения к базе данных."""
 
 import logging
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import UTC, date, datetime, timedelta
 
+from core import migrations, partitions
 from core.config import config
 from models.base import Base
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
@@ -27,11 +30,60 @@ class DatabaseManager:
         )
 
     async def create_tables(self) -> None:
-        """Создает все таблицы в базе данных."""
+        """Создает все таблицы в базе данных.
+
+        Таблицы с устаревшей структурой (см. core.migrations) пересоздаются,
+        для секционированных таблиц переносятся данные за период хранения.
+        """
+        tables = list(Base.metadata.sorted_tables)
+        keep_from, last_day = self._partition_range()
+
         async with self.engine.begin() as conn:
+            legacy: dict[str, str] = {}
+            for table in tables:
+                if await migrations.needs_rebuild(conn, table):
+                    legacy[table.name] = await migrations.detach_legacy_table(conn, table.name)
+                elif not table.info.get("rebuild"):
+                    await migrations.add_missing_columns(conn, table)
+
             await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(migrations.create_missing_indexes, tables)
+            for table in tables:
+                await migrations.drop_obsolete_indexes(conn, table)
+
+            for table in partitions.partitioned_tables(tables):
+                await partitions.ensure_partitions(conn, table, keep_from, last_day)
+
+            for table in tables:
+                if table.name not in legacy:
+                    continue
+                where = ""
+                column = table.info.get("partition_column")
+                if column:
+                    where = f"\"{column}\" >= '{keep_from.isoformat()}'"
+                await migrations.copy_from_legacy(conn, table, legacy[table.name], where)
         logger.info("Таблицы базы данных созданы")
 
+    async def maintain_partitions(self) -> None:
+        """Создаёт секции на ближайшие дни и удаляет секции старше срока хранения."""
+        keep_from, last_day = self._partition_range()
+        try:
+            async with self.engine.begin() as conn:
+                for table in partitions.partitioned_tables(list(Base.metadata.sorted_tables)):
+                    await partitions.ensure_partitions(conn, table, keep_from, last_day)
+                    await partitions.drop_expired_partitions(conn, table, keep_from)
+        except Exception as e:
+            logger.error(f"Ошибка при обслуживании секций: {e}")
+
+    @staticmethod
+    def _partition_range() -> tuple[date, date]:
+        """Возвращает первый хранимый и последний заранее создаваемый день (UTC)."""
+        today = datetime.now(UTC).date()
+        return (
+            today - timedelta(days=config.history_retention_days),
+            today + timedelta(days=config.partition_premake_days),
+        )
+
     async def close(self) -> None:
         """Закрывает соединение с базой данных."""
         await self.engine.dispose()
@@ -51,3 +103,42 @@ async def get_session() -> AsyncGenerator[AsyncSession]:
             raise
         finally:
             await session.close()
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncIterator[AsyncSession]:
+    """Сессия на задачу или её часть: одно соединение пула и одна транзакция.
+
+    Методы хранилищ, получившие эту сессию, выполняются в ней вместо открытия
+    своих. Изменения фиксируются при выходе, при ошибке - откатываются.
+    Держать сессию открытой на время запросов к внешним API не стоит:
+    соединение всё это время занято.
+    """
+    async with db_manager.session_factory() as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+
+
+@asynccontextmanager
+async def session_scope(session: AsyncSession | None = None) -> AsyncIterator[AsyncSession]:
+    """Возвращает переданную сессию или открывает собственную.
+
+    Собственная сессия фиксируется при выходе. Переданная (из unit_of_work)
+    работает внутри SAVEPOINT: ошибка одного метода хранилища откатывает
+    только его изменения, а фиксирует транзакцию владелец сессии.
+
+    Args:
+        session: Сессия unit_of_work или None
+
+    """
+    if session is None:
+        async with unit_of_work() as own_session:
+            yield own_session
+        return
+
+    async with session.begin_nested():
+        yield session
@@ -25,6 +25,7 @@ class CallbackData(Enum):
     PRICE_ALERTS_DROP_CRITICAL = "price_alerts_drop_critical"
     PRICE_ALERTS_RISE_WARNING = "price_alerts_rise_warning"
     PRICE_ALERTS_RISE_CRITICAL = "price_alerts_rise_critical"
+    PRICE_ALERTS_DETECTOR = "price_alerts_detector"
 
 
 class ButtonTexts(Enum):
@@ -0,0 +1,257 @@
+"""Пересоздание таблиц при смене их структуры.
+
+Base.metadata.create_all не меняет существующие таблицы. Таблицы, которые
+нужно пересоздавать при изменении набора колонок или перехода на
+секционирование, помечаются в модели через __table_args__ info:
+
+    rebuild: True - пересоздавать при изменении колонок (секционированные
+        таблицы пересоздаются всегда)
+    legacy_copy: False - не переносить строки прежней таблицы
+    legacy_distinct_on: колонки или SQL выражения, по которым строки
+        схлопываются при переносе
+    legacy_order_by: порядок выбора строки при схлопывании (SQL)
+    dropped_indexes: имена индексов, удалённых из модели, - удаляются и из БД
+
+Прежняя таблица переименовывается в <таблица>_legacy, после create_all общие
+колонки переносятся в новую таблицу, а legacy таблица удаляется. Индексы,
+добавленные в модели существующих таблиц, создаются без пересоздания таблицы.
+Новые колонки остальных таблиц добавляются через ALTER TABLE ADD COLUMN:
+такая колонка должна допускать NULL или иметь server_default.
+"""
+
+import logging
+
+from sqlalchemy import Connection, Table, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+LEGACY_SUFFIX = "_legacy"
+
+
+async def get_relkind(conn: AsyncConnection, table_name: str) -> str | None:
+    """Возвращает тип отношения ('r' - обычная, 'p' - секционированная) или None."""
+    result = await conn.execute(
+        text(
+            "SELECT CAST(c.relkind AS text) FROM pg_class c "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE c.relname = :name AND n.nspname = current_schema()"
+        ),
+        {"name": table_name},
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_columns(conn: AsyncConnection, table_name: str) -> set[str]:
+    """Возвращает имена колонок существующей таблицы."""
+    result = await conn.execute(
+        text(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_name = :name AND table_schema = current_schema()"
+        ),
+        {"name": table_name},
+    )
+    return set(result.scalars().all())
+
+
+async def needs_rebuild(conn: AsyncConnection, table: Table) -> bool:
+    """Проверяет, нужно ли пересоздать существующую таблицу.
+
+    Args:
+        conn: Соединение в открытой транзакции
+        table: Таблица из метаданных моделей
+
+    Returns:
+        True если таблица существует и её структура устарела
+
+    """
+    partitioned = bool(table.info.get("partition_column"))
+    if not partitioned and not table.info.get("rebuild"):
+        return False
+
+    relkind = await get_relkind(conn, table.name)
+    if relkind is None:
+        return False
+    if partitioned and relkind != "p":
+        return True
+    return await get_columns(conn, table.name) != {column.name for column in table.columns}
+
+
+async def detach_legacy_table(conn: AsyncConnection, table_name: str) -> str:
+    """Переименовывает таблицу в <таблица>_legacy, освобождая имена её объектов.
+
+    Ограничения, индексы, секции и последовательности прежней таблицы
+    называются так же, как у новой, поэтому ограничения и индексы удаляются,
+    а секции и последовательности переименовываются. Данные остаются в
+    legacy таблице до переноса.
+
+    Args:
+        conn: Соединение в открытой транзакции
+        table_name: Имя таблицы
+
+    Returns:
+        Имя legacy таблицы
+
+    """
+    legacy_name = f"{table_name}{LEGACY_SUFFIX}"
+    await conn.execute(text(f'DROP TABLE IF EXISTS "{legacy_name}"'))
+    await conn.execute(text(f'ALTER TABLE "{table_name}" RENAME TO "{legacy_name}"'))
+
+    constraints = await conn.execute(
+        text(
+            "SELECT conname FROM pg_constraint "
+            "WHERE conrelid = CAST(:name AS regclass) AND contype IN ('p', 'u')"
+        ),
+        {"name": legacy_name},
+    )
+    for (constraint,) in constraints.all():
+        await conn.execute(text(f'ALTER TABLE "{legacy_name}" DROP CONSTRAINT "{constraint}"'))
+
+    indexes = await conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :name"),
+        {"name": legacy_name},
+    )
+    for (index,) in indexes.all():
+        await conn.execute(text(f'DROP INDEX "{index}"'))
+
+    children = await conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:name AS regclass)"
+        ),
+        {"name": legacy_name},
+    )
+    for (child,) in children.all():
+        await conn.execute(text(f'ALTER TABLE "{child}" RENAME TO "{child}{LEGACY_SUFFIX}"'))
+
+    sequences = await conn.execute(
+        text(
+            "SELECT s.relname FROM pg_class s "
+            "JOIN pg_depend d ON d.objid = s.oid "
+            "WHERE s.relkind = 'S' AND d.refobjid = CAST(:name AS regclass)"
+        ),
+        {"name": legacy_name},
+    )
+    for (sequence,) in sequences.all():
+        await conn.execute(
+            text(f'ALTER SEQUENCE "{sequence}" RENAME TO "{sequence}{LEGACY_SUFFIX}"')
+        )
+
+    logger.info(f"Таблица {table_name} переименована в {legacy_name} для миграции")
+    return legacy_name
+
+
+async def copy_from_legacy(
+    conn: AsyncConnection, table: Table, legacy_name: str, where: str = ""
+) -> int:
+    """Переносит строки из legacy таблицы в новую и удаляет legacy таблицу.
+
+    Переносятся колонки, общие для обеих таблиц, кроме автоинкрементного id.
+
+    Args:
+        conn: Соединение в открытой транзакции
+        table: Новая таблица
+        legacy_name: Имя legacy таблицы
+        where: Условие отбора строк (SQL без WHERE), пустое - все строки
+
+    Returns:
+        Количество перенесённых строк
+
+    """
+    copied = 0
+    if table.info.get("legacy_copy", True):
+        legacy_columns = await get_columns(conn, legacy_name)
+        columns = [
+            column.name
+            for column in table.columns
+            if column.name != "id" and column.name in legacy_columns
+        ]
+        column_list = ", ".join(f'"{column}"' for column in columns)
+
+        select = f"SELECT {column_list} FROM \"{legacy_name}\""
+        if where:
+            select += f" WHERE {where}"
+        distinct_on = table.info.get("legacy_distinct_on")
+        if distinct_on:
+            keys = ", ".join(
+                f'"{column}"' if column.isidentifier() else column for column in distinct_on
+            )
+            order_by = table.info.get("legacy_order_by")
+            select = select.replace("SELECT ", f"SELECT DISTINCT ON ({keys}) ", 1)
+            select += f" ORDER BY {keys}" + (f", {order_by}" if order_by else "")
+
+        result = await conn.execute(
+            text(f'INSERT INTO "{table.name}" ({column_list}) {select}')
+        )
+        copied = result.rowcount
+        logger.info(f"Перенесено {copied} строк из {legacy_name} в {table.name}")
+
+    await conn.execute(text(f'DROP TABLE "{legacy_name}"'))
+    return copied
+
+
+async def add_missing_columns(conn: AsyncConnection, table: Table) -> list[str]:
+    """Добавляет в существующую таблицу колонки модели, которых в ней нет.
+
+    Args:
+        conn: Соединение в открытой транзакции
+        table: Таблица из метаданных моделей
+
+    Returns:
+        Имена добавленных колонок
+
+    """
+    existing = await get_columns(conn, table.name)
+    if not existing:
+        return []
+
+    added = []
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        definition = f'"{column.name}" {column.type.compile(dialect=conn.dialect)}'
+        if column.server_default is not None:
+            default = column.server_default.arg
+            if isinstance(default, str):
+                default = f"'{default}'"
+            else:
+                default = str(default.compile(dialect=conn.dialect))
+            definition += f" DEFAULT {default}"
+        if not column.nullable:
+            definition += " NOT NULL"
+        await conn.execute(
+            text(f'ALTER TABLE "{table.name}" ADD COLUMN IF NOT EXISTS {definition}')
+        )
+        added.append(column.name)
+
+    if added:
+        logger.info(f"В таблицу {table.name} добавлены колонки: {', '.join(added)}")
+    return added
+
+
+def create_missing_indexes(conn: Connection, tables: list[Table]) -> None:
+    """Создаёт индексы моделей, которых ещё нет в существующих таблицах.
+
+    Вызывается через AsyncConnection.run_sync после create_all.
+
+    Args:
+        conn: Синхронное соединение в открытой транзакции
+        tables: Таблицы из метаданных моделей
+
+    """
+    for table in tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+async def drop_obsolete_indexes(conn: AsyncConnection, table: Table) -> None:
+    """Удаляет индексы, перечисленные в info["dropped_indexes"] таблицы.
+
+    Args:
+        conn: Соединение в открытой транзакции
+        table: Таблица из метаданных моделей
+
+    """
+    for name in table.info.get("dropped_indexes", []):
+        await conn.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
@@ -0,0 +1,162 @@
+"""Обслуживание секционированных по времени таблиц PostgreSQL.
+
+Таблица объявляется секционированной в модели через __table_args__:
+postgresql_partition_by="RANGE (<колонка>)" и info={"partition_column": "<колонка>"}.
+Секции создаются по суткам (UTC) с именами <таблица>_pYYYYMMDD, плюс секция
+<таблица>_default для строк вне созданных диапазонов. Устаревшие данные
+удаляются через DROP секции, а не DELETE.
+"""
+
+import logging
+import re
+from datetime import UTC, date, datetime, timedelta
+
+from sqlalchemy import Table, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+
+def partitioned_tables(tables: list[Table]) -> list[Table]:
+    """Возвращает таблицы, объявленные секционированными по времени."""
+    return [table for table in tables if table.info.get("partition_column")]
+
+
+def partition_name(table_name: str, day: date) -> str:
+    """Возвращает имя суточной секции."""
+    return f"{table_name}_p{day:%Y%m%d}"
+
+
+async def ensure_partitions(
+    conn: AsyncConnection, table: Table, first_day: date, last_day: date
+) -> int:
+    """Создаёт суточные секции за [first_day, last_day] и секцию по умолчанию.
+
+    PostgreSQL не создаёт секцию, пока секция по умолчанию содержит строки
+    её диапазона (они попадают туда, если обслуживание секций пропускало
+    запуски). В этом случае секция по умолчанию отсоединяется, недостающие
+    секции создаются, строки их диапазонов переносятся в них, и секция по
+    умолчанию присоединяется обратно.
+
+    Args:
+        conn: Соединение в открытой транзакции
+        table: Секционированная таблица
+        first_day: Первый день (UTC)
+        last_day: Последний день (UTC) включительно
+
+    Returns:
+        Количество созданных секций
+
+    """
+    existing = set(await list_partitions(conn, table.name))
+    created = 0
+
+    default_name = f"{table.name}_default"
+    if default_name not in existing:
+        await conn.execute(
+            text(f'CREATE TABLE IF NOT EXISTS "{default_name}" PARTITION OF "{table.name}" DEFAULT')
+        )
+        created += 1
+
+    missing: list[tuple[str, datetime, datetime]] = []
+    day = first_day
+    while day <= last_day:
+        name = partition_name(table.name, day)
+        if name not in existing:
+            start = datetime(day.year, day.month, day.day, tzinfo=UTC)
+            missing.append((name, start, start + timedelta(days=1)))
+        day += timedelta(days=1)
+    if not missing:
+        return created
+
+    # Строки в секции по умолчанию могут попасть только в диапазоны
+    # отсутствующих секций, поэтому достаточно проверить общий диапазон
+    column = table.info["partition_column"]
+    bounds = {"start": missing[0][1], "end": missing[-1][2]}
+    where = f'"{column}" >= :start AND "{column}" < :end'
+    result = await conn.execute(
+        text(f'SELECT EXISTS (SELECT 1 FROM "{default_name}" WHERE {where})'), bounds
+    )
+    move_rows = bool(result.scalar())
+    if move_rows:
+        await conn.execute(text(f'ALTER TABLE "{table.name}" DETACH PARTITION "{default_name}"'))
+
+    for name, start, end in missing:
+        await conn.execute(
+            text(
+                f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table.name}" '
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+        )
+        created += 1
+
+    if move_rows:
+        result = await conn.execute(
+            text(
+                f'WITH moved AS (DELETE FROM "{default_name}" WHERE {where} RETURNING *) '
+                f'INSERT INTO "{table.name}" SELECT * FROM moved'
+            ),
+            bounds,
+        )
+        await conn.execute(
+            text(f'ALTER TABLE "{table.name}" ATTACH PARTITION "{default_name}" DEFAULT')
+        )
+        logger.warning(
+            f"Строки {table.name} перенесены из секции по умолчанию: {result.rowcount}"
+        )
+
+    logger.info(f"Создано секций {table.name}: {created}")
+    return created
+
+
+async def drop_expired_partitions(
+    conn: AsyncConnection, table: Table, keep_from: date
+) -> int:
+    """Удаляет суточные секции, целиком лежащие раньше keep_from.
+
+    Устаревшие строки в секции по умолчанию удаляются обычным DELETE: туда
+    попадают только строки вне созданных диапазонов.
+
+    Args:
+        conn: Соединение в открытой транзакции
+        table: Секционированная таблица
+        keep_from: Первый сохраняемый день (UTC)
+
+    Returns:
+        Количество удалённых секций
+
+    """
+    pattern = re.compile(rf"^{re.escape(table.name)}_p(\d{{8}})$")
+    dropped = 0
+    for name in await list_partitions(conn, table.name):
+        match = pattern.match(name)
+        if not match:
+            continue
+        day = datetime.strptime(match.group(1), "%Y%m%d").date()
+        if day < keep_from:
+            await conn.execute(text(f'DROP TABLE "{name}"'))
+            dropped += 1
+
+    column = table.info["partition_column"]
+    cutoff = datetime(keep_from.year, keep_from.month, keep_from.day, tzinfo=UTC)
+    await conn.execute(
+        text(f'DELETE FROM "{table.name}_default" WHERE "{column}" < :cutoff'),
+        {"cutoff": cutoff},
+    )
+
+    if dropped:
+        logger.info(f"Удалено устаревших секций {table.name}: {dropped}")
+    return dropped
+
+
+async def list_partitions(conn: AsyncConnection, table_name: str) -> list[str]:
+    """Возвращает имена секций таблицы."""
+    result = await conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:name AS regclass)"
+        ),
+        {"name": table_name},
+    )
+    return list(result.scalars().all())
@@ -0,0 +1,24 @@
+"""Middleware обработчиков бота."""
+
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+from storage.activity_tracker import activity_tracker
+
+
+class ActivityMiddleware(BaseMiddleware):
+    """Отмечает активность пользователя без обращения к БД."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        """Отмечает активность отправителя и передаёт событие обработчику."""
+        user: User | None = data.get("event_from_user")
+        if user is not None:
+            activity_tracker.touch(user.id)
+        return await handler(event, data)
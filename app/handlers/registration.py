@@ -17,6 +17,7 @@ from .base_handlers import (
     start_handler,
 )
 from .coupon_handlers import CouponHandler
+from .middlewares import ActivityMiddleware
 from .setting_handlers import AlertSettingsHandler, SettingHandler, ThresholdStates, TokenStates
 
 logger = logging.getLogger(__name__)
@@ -30,6 +31,10 @@ def register_handlers(dp: Dispatcher, bot: Bot) -> None:
         bot: Экземпляр бота
 
     """
+    # Отметка активности пользователей (запись в БД - пачкой по расписанию)
+    dp.message.outer_middleware(ActivityMiddleware())
+    dp.callback_query.outer_middleware(ActivityMiddleware())
+
     # Обработчики команд
     dp.message.register(start_handler, Command("start"))
 
@@ -75,6 +80,11 @@ def register_handlers(dp: Dispatcher, bot: Bot) -> None:
         F.data == CallbackData.PRICE_ALERTS_SETTINGS.value + "_thresholds",
     )
 
+    dp.callback_query.register(
+        AlertSettingsHandler.handle_detector_select,
+        F.data == CallbackData.PRICE_ALERTS_DETECTOR.value,
+    )
+
     # Обработчики выбора порогов
     threshold_callbacks = {
         CallbackData.PRICE_ALERTS_DROP_WARNING.value,
@@ -7,6 +7,8 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import CallbackQuery, Message
 from core.enums import CallbackData, Messages
 from invest.invest import check_token
+from invest.portfolio import portfolio_cache
+from invest.price_monitor import DETECTOR_LABELS, DetectorType
 from keyboards import KeyboardHelper
 from storage import AlertStorage, BotUserStorage
 
@@ -56,6 +58,7 @@ class SettingHandler:
             logger.info(f"Токен пользователя {telegram_id} валиден")
             success = await BotUserStorage.add_token(telegram_id=telegram_id, token=token)
             if success:
+                portfolio_cache.invalidate(token)
                 main_keyboard = KeyboardHelper.create_main_keyboard()
                 await message.answer("Токен успешно сохранён!", reply_markup=main_keyboard)
                 await state.clear()
@@ -75,8 +78,11 @@ class SettingHandler:
         telegram_id = message.chat.id
         text = str(message.text).strip().lower()
         if text == "удалить":
+            token = await BotUserStorage.get_token_by_telegram_id(telegram_id=telegram_id)
             success = await BotUserStorage.remove_token(telegram_id=telegram_id)
             if success:
+                if token:
+                    portfolio_cache.invalidate(token)
                 new_user_keyboard = KeyboardHelper.create_new_user_keyboard()
                 await message.answer("Токен успешно удалён!", reply_markup=new_user_keyboard)
             else:
@@ -184,6 +190,7 @@ class AlertSettingsHandler:
                 f"Рост:\n"
                 f"  • Умеренное: <b>{settings.rise_warning_threshold}%</b>\n"
                 f"  • Сильное: <b>{settings.rise_critical_threshold}%</b>\n\n"
+                f"Детектор: <b>{DETECTOR_LABELS.get(settings.detector, settings.detector)}</b>\n\n"
                 f"Нажмите на кнопку, чтобы изменить порог."
             )
 
@@ -201,6 +208,28 @@ class AlertSettingsHandler:
             logger.error(f"Ошибка при показе меню порогов: {e}")
             await callback.answer("Произошла ошибка")
 
+    @classmethod
+    async def handle_detector_select(cls, callback: CallbackQuery) -> None:
+        """Переключает детектор аномалий на следующий по кругу."""
+        try:
+            telegram_id = callback.from_user.id
+            settings = await AlertStorage.get_user_settings(telegram_id)
+
+            if not settings:
+                await callback.answer("Сначала включите уведомления")
+                return
+
+            detectors = [detector.value for detector in DetectorType]
+            current = settings.detector if settings.detector in detectors else detectors[-1]
+            detector = detectors[(detectors.index(current) + 1) % len(detectors)]
+            await AlertStorage.update_user_settings(telegram_id, detector=detector)
+
+            await cls.handle_thresholds_menu(callback)
+
+        except Exception as e:
+            logger.error(f"Ошибка при смене детектора: {e}")
+            await callback.answer("Произошла ошибка")
+
     @classmethod
     async def handle_threshold_select(cls, callback: CallbackQuery, state: FSMContext) -> None:
         """Обрабатывает выбор порога для изменения."""
@@ -0,0 +1,125 @@
+"""Состояние anti-spam правил алертов в памяти."""
+
+import asyncio
+import logging
+from datetime import UTC, datetime, timedelta
+
+from storage import AlertStorage
+from storage.alert_storage import ALERT_COOLDOWN_HOURS
+
+logger = logging.getLogger(__name__)
+
+
+class AlertStateEngine:
+    """Последние алерты по (пользователь, figi) и дневные счётчики в памяти.
+
+    Состояние восстанавливается из sent_alerts при старте, поэтому перезапуск
+    не сбрасывает cooldown и дневной лимит. Отправленные алерты сразу
+    учитываются в памяти, а в sent_alerts записываются пачкой при flush.
+    """
+
+    def __init__(self, cooldown: timedelta) -> None:
+        """Инициализирует пустое состояние.
+
+        Args:
+            cooldown: Период cooldown между алертами по одной бумаге
+
+        """
+        self.cooldown = cooldown
+        # (telegram_id, figi) -> (alert_type, sent_at)
+        self._last: dict[tuple[int, str], tuple[str, datetime]] = {}
+        # telegram_id -> (день UTC, количество алертов за день)
+        self._daily: dict[int, tuple[int, int]] = {}
+        self._pending: list[dict] = []
+        self._flush_lock = asyncio.Lock()
+
+    async def load(self) -> None:
+        """Восстанавливает состояние из sent_alerts."""
+        now = datetime.now(UTC)
+        since = min(self._day_start(now), now - self.cooldown)
+        alerts = await AlertStorage.get_recent_alerts(since)
+
+        self._last.clear()
+        self._daily.clear()
+        # Выборка от новых к старым: восстанавливаем в хронологическом порядке
+        for telegram_id, figi, alert_type, sent_at in reversed(alerts):
+            self._apply(telegram_id, figi, alert_type, sent_at)
+        logger.info(
+            f"Состояние алертов восстановлено: {len(alerts)} алертов, "
+            f"{len(self._daily)} пользователей"
+        )
+
+    def daily_count(self, telegram_id: int) -> int:
+        """Возвращает количество алертов пользователя за текущие сутки (UTC)."""
+        entry = self._daily.get(telegram_id)
+        if entry is None or entry[0] != datetime.now(UTC).toordinal():
+            return 0
+        return entry[1]
+
+    def last_alert_type(self, telegram_id: int, figi: str) -> str | None:
+        """Возвращает тип последнего алерта по бумаге, если cooldown ещё активен."""
+        entry = self._last.get((telegram_id, figi))
+        if entry is None or entry[1] <= datetime.now(UTC) - self.cooldown:
+            return None
+        return entry[0]
+
+    def record(self, telegram_id: int, alerts: list[tuple[str, str]]) -> None:
+        """Учитывает отправленные алерты и ставит их в очередь на запись.
+
+        Args:
+            telegram_id: ID пользователя
+            alerts: Список пар (figi, alert_type)
+
+        """
+        now = datetime.now(UTC)
+        for figi, alert_type in alerts:
+            self._apply(telegram_id, figi, alert_type, now)
+            self._pending.append(
+                {
+                    "telegram_id": telegram_id,
+                    "figi": figi,
+                    "alert_type": alert_type,
+                    "sent_at": now,
+                    "daily_count": 1,
+                }
+            )
+
+    async def flush(self) -> None:
+        """Записывает накопленные алерты в sent_alerts и удаляет устаревшее состояние."""
+        async with self._flush_lock:
+            self._prune()
+            if not self._pending:
+                return
+            rows, self._pending = self._pending, []
+            if not await AlertStorage.save_sent_alerts(rows):
+                # Повторим при следующем flush
+                self._pending = rows + self._pending
+                return
+            logger.debug(f"Записано {len(rows)} отправленных алертов")
+
+    def _apply(self, telegram_id: int, figi: str, alert_type: str, sent_at: datetime) -> None:
+        """Обновляет состояние одним алертом."""
+        self._last[(telegram_id, figi)] = (alert_type, sent_at)
+        day = sent_at.toordinal()
+        current_day, count = self._daily.get(telegram_id, (day, 0))
+        self._daily[telegram_id] = (day, count + 1 if current_day == day else 1)
+
+    def _prune(self) -> None:
+        """Удаляет записи с истёкшим cooldown и счётчики прошедших суток."""
+        now = datetime.now(UTC)
+        cooldown_start = now - self.cooldown
+        today = now.toordinal()
+        self._last = {
+            key: entry for key, entry in self._last.items() if entry[1] > cooldown_start
+        }
+        self._daily = {
+            telegram_id: entry for telegram_id, entry in self._daily.items() if entry[0] == today
+        }
+
+    @staticmethod
+    def _day_start(now: datetime) -> datetime:
+        """Возвращает начало суток (UTC)."""
+        return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+alert_state = AlertStateEngine(cooldown=timedelta(hours=ALERT_COOLDOWN_HOURS))
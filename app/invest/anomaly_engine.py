@@ -0,0 +1,143 @@
+"""Поиск аномалий цен сразу по всем пользователям и облигациям.
+
+Рыночные цены общие для всех пользователей, поэтому изменение цены
+считается один раз на (детектор, figi), а с порогами сравниваются все пары
+(пользователь, облигация) одной операцией над массивами NumPy. Результат
+совпадает с построчным расчётом по каждому пользователю
+(tests/anomaly_reference.py).
+"""
+
+from collections.abc import Mapping
+
+import numpy as np
+
+from .models import Bond
+from .price_monitor import AlertType, DetectorType, PriceAnomaly
+
+# Коды типов алертов в массиве результата (0 - нет алерта)
+ALERT_CODES = [
+    None,
+    AlertType.DROP_WARNING,
+    AlertType.DROP_CRITICAL,
+    AlertType.RISE_WARNING,
+    AlertType.RISE_CRITICAL,
+]
+
+
+def detect_anomalies_batch(
+    holdings: Mapping[int, Mapping[str, str]],
+    settings: Mapping[int, object],
+    current_prices: Mapping[str, float],
+    previous_prices: Mapping[str, float],
+    bonds: Mapping[str, Bond],
+    baselines: Mapping[str, Mapping[str, float]] | None = None,
+) -> dict[int, list[PriceAnomaly]]:
+    """Находит аномалии цен у всех пользователей.
+
+    Текущая цена сравнивается с базовой ценой детектора пользователя
+    (settings.detector, по умолчанию snapshot): для snapshot это предыдущая
+    цена, для остальных - цена из baselines.
+
+    Args:
+        holdings: Облигации пользователей: telegram_id -> figi -> название счёта
+        settings: Настройки уведомлений (пороги и детектор) по telegram_id
+        current_prices: Текущие цены по figi
+        previous_prices: Предыдущие цены по figi
+        bonds: Справочник облигаций по figi (тикер и название)
+        baselines: Базовые цены по figi для остальных детекторов
+
+    Returns:
+        Аномалии по telegram_id в порядке облигаций пользователя
+        (пользователи без аномалий отсутствуют)
+
+    """
+    baselines = {DetectorType.SNAPSHOT.value: previous_prices, **(baselines or {})}
+
+    # Изменение цены по (детектор, figi); NaN - сравнивать не с чем
+    detectors = list(baselines)
+    detector_index = {detector: i for i, detector in enumerate(detectors)}
+    figis = [figi for figi in current_prices if figi in bonds]
+    figi_index = {figi: i for i, figi in enumerate(figis)}
+    new = np.fromiter((current_prices[figi] for figi in figis), float, len(figis))
+    old = np.array(
+        [[baselines[d].get(figi) or np.nan for figi in figis] for d in detectors], float
+    ).reshape(len(detectors), len(figis))
+    # Последние строка и столбец - NaN для неизвестного детектора и облигаций вне figis
+    change_by_figi = np.full((len(detectors) + 1, len(figis) + 1), np.nan)
+    change_by_figi[:-1, :-1] = ((new - old) / old) * 100
+
+    # Пары (пользователь, облигация) подряд по пользователям
+    user_ids = [telegram_id for telegram_id in holdings if telegram_id in settings]
+    counts = np.fromiter((len(holdings[uid]) for uid in user_ids), np.int64, len(user_ids))
+    pair_figis: list[str] = []
+    pair_accounts: list[str] = []
+    for telegram_id in user_ids:
+        pair_figis.extend(holdings[telegram_id])
+        pair_accounts.extend(holdings[telegram_id].values())
+    pair_user = np.repeat(np.arange(len(user_ids)), counts)
+    user_detectors = np.fromiter(
+        (detector_index.get(_detector(settings[uid]), -1) for uid in user_ids),
+        np.int64,
+        len(user_ids),
+    )
+    change = change_by_figi[
+        user_detectors[pair_user],
+        np.fromiter((figi_index.get(figi, -1) for figi in pair_figis), np.int64, len(pair_figis)),
+    ]
+
+    def thresholds(name: str) -> np.ndarray:
+        values = (getattr(settings[uid], name) for uid in user_ids)
+        return np.fromiter(values, float, len(user_ids))[pair_user]
+
+    # Порядок присваиваний: критический порог перекрывает предупреждение
+    codes = np.zeros(len(change), np.int8)
+    with np.errstate(invalid="ignore"):
+        drop = np.abs(change)
+        falling = change < 0
+        rising = change > 0
+        codes[falling & (drop >= thresholds("drop_warning_threshold"))] = 1
+        codes[falling & (drop >= thresholds("drop_critical_threshold"))] = 2
+        codes[rising & (change >= thresholds("rise_warning_threshold"))] = 3
+        codes[rising & (change >= thresholds("rise_critical_threshold"))] = 4
+
+    result: dict[int, list[PriceAnomaly]] = {}
+    for pair in np.flatnonzero(codes).tolist():
+        figi = pair_figis[pair]
+        user = pair_user[pair]
+        result.setdefault(user_ids[user], []).append(
+            _make_anomaly(
+                bonds[figi],
+                baselines[detectors[user_detectors[user]]][figi],
+                current_prices[figi],
+                float(change[pair]),
+                ALERT_CODES[codes[pair]],
+                pair_accounts[pair],
+            )
+        )
+    return result
+
+
+def _detector(user_settings: object) -> str:
+    """Возвращает детектор пользователя."""
+    return getattr(user_settings, "detector", None) or DetectorType.SNAPSHOT.value
+
+
+def _make_anomaly(
+    bond: Bond,
+    old_price: float,
+    new_price: float,
+    change_percent: float,
+    alert_type: AlertType,
+    account_name: str,
+) -> PriceAnomaly:
+    """Создаёт описание аномалии."""
+    return PriceAnomaly(
+        figi=bond.figi,
+        ticker=bond.ticker,
+        name=bond.name,
+        old_price=old_price,
+        new_price=new_price,
+        change_percent=change_percent,
+        alert_type=alert_type,
+        account_name=account_name,
+    )
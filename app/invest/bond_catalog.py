@@ -0,0 +1,140 @@
+"""Общий для всего процесса справочник облигаций."""
+
+import asyncio
+import logging
+import time
+from datetime import UTC, datetime
+
+from core.config import config
+from storage import InstrumentStorage
+
+from .invest import get_service_token
+from .models import Bond
+from .tbank_client import TBankClient
+
+logger = logging.getLogger(__name__)
+
+
+class BondCatalog:
+    """Справочник облигаций в памяти с периодическим обновлением.
+
+    Справочник загружается из API один раз, обновляется по расписанию и
+    сохраняется в БД, чтобы после перезапуска бот стартовал с готовыми данными.
+    """
+
+    def __init__(self, refresh_interval: float) -> None:
+        """Инициализирует пустой справочник.
+
+        Args:
+            refresh_interval: Интервал обновления в секундах
+
+        """
+        self.refresh_interval = refresh_interval
+        self._bonds: dict[str, Bond] = {}
+        self._updated_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def is_stale(self) -> bool:
+        """Справочник пуст или не обновлялся дольше интервала."""
+        if not self._bonds or self._updated_at is None:
+            return True
+        return time.time() - self._updated_at > self.refresh_interval
+
+    def get(self, figi: str) -> Bond | None:
+        """Возвращает облигацию по figi из памяти."""
+        return self._bonds.get(figi)
+
+    def get_all(self) -> dict[str, Bond]:
+        """Возвращает весь справочник из памяти (figi -> Bond), не изменять."""
+        return self._bonds
+
+    async def get_bonds(self, client: TBankClient) -> dict[str, Bond]:
+        """Возвращает справочник облигаций по figi.
+
+        Если справочник ещё не загружен, он загружается через переданный клиент.
+
+        Args:
+            client: Открытый клиент T-Invest API
+
+        Returns:
+            Словарь figi -> Bond
+
+        """
+        if not self._bonds:
+            async with self._lock:
+                if not self._bonds:
+                    await self._fetch(client)
+        return self._bonds
+
+    async def refresh(self) -> bool:
+        """Обновляет справочник из API (задача scheduler).
+
+        Returns:
+            True если справочник обновлён
+
+        """
+        token = await get_service_token()
+        if not token:
+            logger.warning("Нет токена для обновления справочника облигаций")
+            return False
+
+        try:
+            async with self._lock, TBankClient(token) as client:
+                await self._fetch(client)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении справочника облигаций: {e}")
+            return False
+
+    async def load_snapshot(self) -> None:
+        """Загружает сохранённый снимок справочника из БД."""
+        entries = await InstrumentStorage.get_bond_catalog()
+        if not entries:
+            logger.info("Снимок справочника облигаций пуст")
+            return
+
+        self._bonds = {
+            entry.figi: Bond.model_validate(
+                {
+                    "figi": entry.figi,
+                    "ticker": entry.ticker,
+                    "name": entry.name,
+                    "nominal": {"units": entry.nominal_units, "nano": entry.nominal_nano},
+                    "currency": entry.currency,
+                    "maturityDate": entry.maturity_date,
+                    "couponQuantityPerYear": entry.coupon_quantity_per_year,
+                }
+            )
+            for entry in entries
+        }
+        self._updated_at = min(entry.updated_at for entry in entries).timestamp()
+        logger.info(f"Справочник облигаций загружен из снимка: {len(self._bonds)} шт.")
+
+    async def _fetch(self, client: TBankClient) -> None:
+        """Загружает справочник из API и сохраняет снимок в БД."""
+        bonds = await client.get_bonds()
+        self._bonds = {bond.figi: bond for bond in bonds}
+        self._updated_at = time.time()
+        logger.info(f"Справочник облигаций обновлён: {len(self._bonds)} шт.")
+
+        updated_at = datetime.now(UTC)
+        await InstrumentStorage.replace_bond_catalog(
+            [
+                {
+                    "figi": bond.figi,
+                    "ticker": bond.ticker,
+                    "name": bond.name,
+                    "nominal_units": bond.nominal.units,
+                    "nominal_nano": bond.nominal.nano,
+                    "currency": bond.currency,
+                    "maturity_date": bond.maturity_date,
+                    "coupon_quantity_per_year": bond.coupon_quantity_per_year,
+                    "updated_at": updated_at,
+                }
+                for bond in self._bonds.values()
+            ]
+        )
+
+
+bond_catalog = BondCatalog(refresh_interval=config.bond_catalog_refresh_hours * 3600)
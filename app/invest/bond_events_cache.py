@@ -0,0 +1,221 @@
+"""Кэш событий по облигациям (оферты, погашения) в памяти и в БД."""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import UTC, datetime, timedelta
+
+from core.config import config
+from storage import InstrumentStorage
+
+from .invest import get_service_token
+from .models import BondEvent, EventType
+from .tbank_client import TBankClient
+
+logger = logging.getLogger(__name__)
+
+CacheKey = tuple[str, str, int]  # (figi, event_type, window_days)
+
+
+class BondEventsCache:
+    """Двухуровневый кэш GetBondEvents: LRU в памяти и таблица bond_events_cache.
+
+    События запрашиваются на горизонт window_days + TTL от момента загрузки,
+    поэтому запись остаётся полной для любого запроса в пределах TTL.
+    Прочитанные ключи запоминаются в памяти и записываются в accessed_at
+    перед ночным обновлением; записи, которые давно не читали, удаляются.
+    """
+
+    def __init__(self, ttl: float, max_size: int) -> None:
+        """Инициализирует кэш.
+
+        Args:
+            ttl: Время жизни записи в секундах
+            max_size: Максимальное количество записей в памяти
+
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._memory: OrderedDict[CacheKey, tuple[float, list[BondEvent]]] = OrderedDict()
+        self._accessed: set[CacheKey] = set()
+
+    async def get_events(
+        self,
+        client: TBankClient,
+        figis: list[str],
+        event_type: EventType,
+        window_days: int,
+    ) -> list[list[BondEvent] | None]:
+        """Возвращает события для списка figi, обращаясь к API только при промахах.
+
+        Args:
+            client: Открытый клиент T-Invest API
+            figis: Список FIGI облигаций
+            event_type: Тип события
+            window_days: Горизонт событий в днях от текущего момента
+
+        Returns:
+            События в порядке figis; None для figi, по которым запрос не удался
+
+        """
+        now = datetime.now(UTC)
+        results: dict[str, list[BondEvent] | None] = {}
+        self._accessed.update((figi, event_type.value, window_days) for figi in figis)
+
+        # 1. Память
+        misses: list[str] = []
+        for figi in figis:
+            events = self._get_from_memory((figi, event_type.value, window_days))
+            if events is None:
+                misses.append(figi)
+            else:
+                results[figi] = events
+
+        # 2. БД
+        if misses:
+            entries = await InstrumentStorage.get_bond_events(
+                misses, event_type.value, window_days, now - timedelta(seconds=self.ttl)
+            )
+            for entry in entries:
+                events = [BondEvent.model_validate(event) for event in entry.events]
+                self._put_to_memory(
+                    (entry.figi, entry.event_type, entry.window_days),
+                    events,
+                    entry.fetched_at.timestamp(),
+                )
+                results[entry.figi] = events
+            misses = [figi for figi in misses if figi not in results]
+
+        # 3. API
+        if misses:
+            logger.debug(f"Bond events cache misses: {len(misses)} of {len(figis)}")
+            fetched = await self._fetch(client, misses, event_type, window_days)
+            results.update(fetched)
+
+        # Отбрасываем события вне запрошенного окна
+        until = now + timedelta(days=window_days)
+        filtered: list[list[BondEvent] | None] = []
+        for figi in figis:
+            events = results.get(figi)
+            if events is not None:
+                events = [e for e in events if now <= e.event_date <= until]
+            filtered.append(events)
+        return filtered
+
+    async def refresh_all(self) -> None:
+        """Перезагружает все записи кэша из API (ночная задача scheduler).
+
+        Сначала записывает время чтения и удаляет записи, которые не читали
+        дольше bond_events_cache_idle_days: бумаги, которых больше нет в
+        портфелях, не обновляются вечно.
+        """
+        now = datetime.now(UTC)
+        accessed, self._accessed = self._accessed, set()
+        if not await InstrumentStorage.touch_bond_events(accessed, now):
+            self._accessed |= accessed
+        removed = await InstrumentStorage.delete_idle_bond_events(
+            now - timedelta(days=config.bond_events_cache_idle_days)
+        )
+        if removed:
+            logger.info(f"Удалено неиспользуемых записей кэша событий облигаций: {removed}")
+
+        keys = await InstrumentStorage.get_bond_events_keys()
+        alive = set(keys)
+        for key in [key for key in self._memory if key not in alive]:
+            del self._memory[key]
+        if not keys:
+            return
+
+        token = await get_service_token()
+        if not token:
+            logger.warning("Нет токена для обновления кэша событий облигаций")
+            return
+
+        groups: dict[tuple[str, int], list[str]] = {}
+        for figi, event_type, window_days in keys:
+            groups.setdefault((event_type, window_days), []).append(figi)
+
+        try:
+            async with TBankClient(token) as client:
+                for (event_type, window_days), figis in groups.items():
+                    await self._fetch(client, figis, EventType(event_type), window_days)
+            logger.info(f"Кэш событий облигаций обновлён: {len(keys)} записей")
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении кэша событий облигаций: {e}")
+
+    async def _fetch(
+        self,
+        client: TBankClient,
+        figis: list[str],
+        event_type: EventType,
+        window_days: int,
+    ) -> dict[str, list[BondEvent] | None]:
+        """Загружает события из API параллельно и сохраняет их в кэш.
+
+        Границы окна запроса округляются до часа, чтобы одновременные
+        промахи разных пользователей по одной бумаге давали одинаковый
+        запрос и объединялись в TBankClient.
+        """
+        now = datetime.now(UTC)
+        from_ = now.replace(minute=0, second=0, microsecond=0)
+        to = from_ + timedelta(days=window_days, seconds=self.ttl, hours=1)
+        semaphore = asyncio.Semaphore(config.tinvest_events_concurrency)
+
+        async def fetch_one(figi: str) -> list[BondEvent] | None:
+            async with semaphore:
+                try:
+                    return await client.get_bond_events(
+                        instrument_id=figi, from_=from_, to=to, event_type=event_type
+                    )
+                except Exception as e:
+                    logger.error(f"Error getting bond events for figi={figi}: {e}")
+                    return None
+
+        fetched = await asyncio.gather(*(fetch_one(figi) for figi in figis))
+        results = dict(zip(figis, fetched, strict=True))
+
+        entries: list[dict] = []
+        for figi, events in results.items():
+            if events is None:
+                continue
+            self._put_to_memory((figi, event_type.value, window_days), events, now.timestamp())
+            entries.append(
+                {
+                    "figi": figi,
+                    "event_type": event_type.value,
+                    "window_days": window_days,
+                    "events": [e.model_dump(mode="json", by_alias=True) for e in events],
+                    "fetched_at": now,
+                }
+            )
+        await InstrumentStorage.save_bond_events(entries)
+
+        return results
+
+    def _get_from_memory(self, key: CacheKey) -> list[BondEvent] | None:
+        """Возвращает свежую запись из памяти."""
+        item = self._memory.get(key)
+        if item is None:
+            return None
+
+        fetched_at, events = item
+        if time.time() - fetched_at > self.ttl:
+            del self._memory[key]
+            return None
+
+        self._memory.move_to_end(key)
+        return events
+
+    def _put_to_memory(self, key: CacheKey, events: list[BondEvent], fetched_at: float) -> None:
+        """Кладёт запись в память, вытесняя самые старые."""
+        self._memory[key] = (fetched_at, events)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+
+bond_events_cache = BondEventsCache(
+    ttl=config.bond_events_cache_ttl_hours * 3600,
+    max_size=config.bond_events_cache_size,
+)
@@ -1,16 +1,21 @@
 """Функции для работы с облигациями через T-Invest API."""
 
-import asyncio
 import logging
 from datetime import UTC, datetime, timedelta
 
 from storage import BotUserStorage
 
+from .bond_catalog import bond_catalog
+from .bond_events_cache import bond_events_cache
 from .models import EventType
+from .portfolio import collect_positions
 from .tbank_client import TBankClient
 
 logger = logging.getLogger(__name__)
 
+# Горизонт поиска оферт в днях
+OFFERS_WINDOW_DAYS = 365
+
 
 async def get_nearest_maturities(telegram_id: int, limit: int = 5) -> str | None:
     """Получает ближайшие погашения облигаций из портфеля пользователя.
@@ -30,39 +35,32 @@ async def get_nearest_maturities(telegram_id: int, limit: int = 5) -> str | None
     bonds_with_maturity: list[dict] = []
 
     async with TBankClient(token) as client:
-        # Получаем все облигации одним запросом и строим кэш по figi
-        all_bonds = await client.get_bonds()
-        bonds_cache = {bond.figi: bond for bond in all_bonds}
-
-        accounts = await client.get_accounts()
-
-        for account in accounts:
-            portfolio = await client.get_portfolio(account_id=account.id)
-
-            for position in portfolio.positions:
-                if position.instrument_type != "bond":
-                    continue
-
-                bond = bonds_cache.get(position.figi)
-                if not bond or not bond.maturity_date:
-                    continue
-
-                quantity = int(position.quantity.to_float())
-                current_price = position.current_price.to_float()
-                nominal = bond.nominal.to_float()
-
-                bonds_with_maturity.append(
-                    {
-                        "name": bond.name,
-                        "ticker": bond.ticker,
-                        "maturity_date": bond.maturity_date,
-                        "quantity": quantity,
-                        "nominal": nominal,
-                        "current_price": current_price,
-                        "currency": bond.currency,
-                        "account_name": account.name,
-                    }
-                )
+        # Справочник облигаций по figi из общего кэша
+        bonds_cache = await bond_catalog.get_bonds(client)
+
+        items = await collect_positions(client)
+
+    for item in items:
+        bond = bonds_cache.get(item.position.figi)
+        if not bond or not bond.maturity_date:
+            continue
+
+        quantity = int(item.position.quantity.to_float())
+        current_price = item.position.current_price.to_float()
+        nominal = bond.nominal.to_float()
+
+        bonds_with_maturity.append(
+            {
+                "name": bond.name,
+                "ticker": bond.ticker,
+                "maturity_date": bond.maturity_date,
+                "quantity": quantity,
+                "nominal": nominal,
+                "current_price": current_price,
+                "currency": bond.currency,
+                "account_name": item.account.name,
+            }
+        )
 
     if not bonds_with_maturity:
         return None
@@ -112,78 +110,57 @@ async def get_nearest_offers(telegram_id: int, limit: int = 5) -> str | None:
         return "Токен не найден. Добавьте токен в настройках."
 
     now = datetime.now(UTC)
-    future_date = now + timedelta(days=365)
+    future_date = now + timedelta(days=OFFERS_WINDOW_DAYS)
     logger.info(f"Searching offers from {now.isoformat()} to {future_date.isoformat()}")
 
     async with TBankClient(token) as client:
-        # 1. Получаем все облигации одним запросом и строим кэш по figi
-        all_bonds = await client.get_bonds()
-        bonds_cache = {bond.figi: bond for bond in all_bonds}
+        # 1. Справочник облигаций по figi из общего кэша
+        bonds_cache = await bond_catalog.get_bonds(client)
 
         # 2. Собираем позиции из портфелей
         positions_by_figi: dict[str, list[dict]] = {}  # figi -> [{account_name, quantity}]
-        accounts = await client.get_accounts()
 
-        for account in accounts:
-            portfolio = await client.get_portfolio(account_id=account.id)
+        for item in await collect_positions(client):
+            figi = item.position.figi
+            if figi not in positions_by_figi:
+                positions_by_figi[figi] = []
+
+            positions_by_figi[figi].append({
+                "account_name": item.account.name,
+                "quantity": int(item.position.quantity.to_float()),
+            })
+
+        # 3. Запрашиваем события только для уникальных figi (из кэша, API только при промахах)
+        logger.info(f"Found {len(positions_by_figi)} unique bonds to check for offers")
+        figis = [figi for figi in positions_by_figi if figi in bonds_cache]
+        events_by_figi = await bond_events_cache.get_events(
+            client, figis, EventType.EVENT_TYPE_CALL, window_days=OFFERS_WINDOW_DAYS
+        )
 
-            for position in portfolio.positions:
-                if position.instrument_type != "bond":
-                    continue
+    # 4. Собираем оферты в порядке портфеля, независимо от порядка ответов
+    offers_dict: dict[tuple, dict] = {}  # ключ: (ticker, offer_date, account_name)
 
-                figi = position.figi
-                if figi not in positions_by_figi:
-                    positions_by_figi[figi] = []
+    for figi, events in zip(figis, events_by_figi, strict=True):
+        if not events:
+            continue
 
-                positions_by_figi[figi].append({
-                    "account_name": account.name,
-                    "quantity": int(position.quantity.to_float()),
-                })
+        bond = bonds_cache[figi]
+        nominal = bond.nominal.to_float()
 
-        # 3. Запрашиваем события только для уникальных figi
-        logger.info(f"Found {len(positions_by_figi)} unique bonds to check for offers")
-        offers_dict: dict[tuple, dict] = {}  # ключ: (ticker, offer_date, account_name)
-
-        for figi, positions in positions_by_figi.items():
-            bond = bonds_cache.get(figi)
-            if not bond:
-                continue
-
-            try:
-                logger.debug(
-                    f"Requesting bond events for figi={figi}, ticker={bond.ticker}, "
-                    f"from={now.isoformat()}, to={future_date.isoformat()}"
-                )
-                events = await client.get_bond_events(
-                    instrument_id=figi,
-                    from_=now,
-                    to=future_date,
-                    event_type=EventType.EVENT_TYPE_CALL,
-                )
-                logger.debug(f"Got {len(events)} events for {bond.ticker}")
-
-                for event in events:
-                    nominal = bond.nominal.to_float()
-
-                    # Добавляем запись для каждого счёта, где есть эта облигация
-                    for pos in positions:
-                        key = (bond.ticker, event.event_date, pos["account_name"])
-                        if key not in offers_dict:
-                            offers_dict[key] = {
-                                "name": bond.name,
-                                "ticker": bond.ticker,
-                                "offer_date": event.event_date,
-                                "quantity": pos["quantity"],
-                                "nominal": nominal,
-                                "currency": bond.currency,
-                                "account_name": pos["account_name"],
-                            }
-            except Exception as e:
-                logger.error(f"Error getting bond events for figi={figi}, ticker={bond.ticker}: {e}")
-                continue
-
-            # Небольшая задержка между запросами чтобы не перегружать API
-            await asyncio.sleep(0.05)
+        for event in events:
+            # Добавляем запись для каждого счёта, где есть эта облигация
+            for pos in positions_by_figi[figi]:
+                key = (bond.ticker, event.event_date, pos["account_name"])
+                if key not in offers_dict:
+                    offers_dict[key] = {
+                        "name": bond.name,
+                        "ticker": bond.ticker,
+                        "offer_date": event.event_date,
+                        "quantity": pos["quantity"],
+                        "nominal": nominal,
+                        "currency": bond.currency,
+                        "account_name": pos["account_name"],
+                    }
 
     if not offers_dict:
         logger.info("No offers found for the next year")
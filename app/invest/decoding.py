@@ -0,0 +1,155 @@
+"""Декодирование ответов T-Invest API в pydantic модели."""
+
+import asyncio
+import functools
+import json
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, TypeVar
+
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # orjson - необязательная зависимость (extra "orjson")
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+M = TypeVar("M", bound=BaseModel)
+
+# Исполнители для разбора больших ответов
+EXECUTOR_NONE = "none"  # разбор в event loop
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+
+# Бэкенды декодирования JSON
+BACKEND_PYDANTIC = "pydantic"  # model_validate_json: разбор и валидация за один проход
+BACKEND_ORJSON = "orjson"  # orjson.loads + model_validate
+BACKEND_JSON = "json"  # json.loads + model_validate
+
+
+def loads(raw: bytes) -> Any:
+    """Разбирает JSON самым быстрым доступным парсером."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+@functools.cache
+def available_backend(backend: str) -> str:
+    """Возвращает бэкенд декодирования, если он доступен, иначе pydantic.
+
+    Предупреждение о недоступном бэкенде пишется в лог один раз.
+
+    Args:
+        backend: Настроенный бэкенд декодирования (BACKEND_*)
+
+    Returns:
+        Бэкенд, которым будут декодироваться ответы
+
+    """
+    if backend == BACKEND_ORJSON and orjson is None:
+        logger.warning(
+            "Бэкенд декодирования orjson недоступен (установите extra orjson), "
+            "используется pydantic"
+        )
+        return BACKEND_PYDANTIC
+    return backend
+
+
+def decode_response(raw: bytes, model: type[M], backend: str = BACKEND_PYDANTIC) -> M:
+    """Декодирует тело ответа в модель.
+
+    Бэкенд pydantic разбирает байты сразу в модель: поля, которых нет в модели
+    (у Bonds это большая часть каждого инструмента), пропускаются без создания
+    Python объектов. Бэкенды orjson и json сначала строят полный dict.
+
+    Args:
+        raw: Тело ответа
+        model: Класс модели ответа
+        backend: Бэкенд декодирования (BACKEND_*)
+
+    Returns:
+        Экземпляр модели
+
+    """
+    if backend == BACKEND_ORJSON and orjson is not None:
+        return model.model_validate(orjson.loads(raw))
+    if backend == BACKEND_JSON:
+        return model.model_validate(json.loads(raw))
+    return model.model_validate_json(raw)
+
+
+class ParseExecutor:
+    """Разбор больших ответов вне event loop.
+
+    Ответы меньше порога разбираются на месте: передача в пул дороже самого
+    разбора. Большие (справочник облигаций) уходят в пул потоков или процессов,
+    чтобы не блокировать обработку сообщений бота.
+
+    Пул процессов переносит нагрузку, а не убирает её: готовая модель
+    возвращается через pickle, и её распаковка в основном процессе стоит
+    сопоставимо с самим разбором (на 20 тыс. облигаций 0.33-0.43 с против
+    ~0.5 с, см. benchmarks/decode_bonds.py). Процессы запускаются через
+    forkserver: fork многопоточного процесса с event loop может зависнуть.
+    """
+
+    def __init__(self, kind: str, threshold: int, max_workers: int) -> None:
+        """Инициализирует исполнитель.
+
+        Args:
+            kind: Тип пула (EXECUTOR_*)
+            threshold: Размер ответа в байтах, начиная с которого разбор выносится в пул
+            max_workers: Количество потоков или процессов пула
+
+        """
+        self.kind = kind
+        self.threshold = threshold
+        self.max_workers = max_workers
+        self._executor: Executor | None = None
+
+    async def decode(self, raw: bytes, model: type[M], backend: str = BACKEND_PYDANTIC) -> M:
+        """Декодирует ответ, при необходимости в пуле.
+
+        Args:
+            raw: Тело ответа
+            model: Класс модели ответа
+            backend: Бэкенд декодирования (BACKEND_*)
+
+        Returns:
+            Экземпляр модели
+
+        """
+        backend = available_backend(backend)
+        if self.kind == EXECUTOR_NONE or len(raw) < self.threshold:
+            return decode_response(raw, model, backend)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), decode_response, raw, model, backend
+        )
+
+    def shutdown(self) -> None:
+        """Останавливает пул."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _get_executor(self) -> Executor:
+        """Создаёт пул при первом обращении."""
+        if self._executor is None:
+            if self.kind == EXECUTOR_PROCESS:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                )
+            elif self.kind == EXECUTOR_THREAD:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="tinvest-parse"
+                )
+            else:
+                raise ValueError(f"Неизвестный тип пула разбора: {self.kind}")
+            logger.info(f"Пул разбора ответов создан: {self.kind}, {self.max_workers} шт.")
+        return self._executor
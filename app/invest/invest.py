@@ -2,29 +2,35 @@
 
 from datetime import datetime
 
+from core.config import config
 from storage import BotUserStorage
 
 from .models import OperationType
+from .portfolio import portfolio_cache
 from .tbank_client import TBankClient
 
 
-async def get_coupon_payment(user_id: int, start_datetime: datetime) -> str:
+async def get_coupon_payment(
+    user_id: int, start_datetime: datetime, token: str | None = None
+) -> str:
     """Получает сумму выплат купонов за период.
 
     Args:
         user_id: Telegram ID пользователя
         start_datetime: Начало периода
+        token: Токен пользователя (None - берётся из хранилища)
 
     Returns:
         Отформатированное сообщение с суммами выплат
 
     """
-    token = await BotUserStorage.get_token_by_telegram_id(telegram_id=user_id)
+    if token is None:
+        token = await BotUserStorage.get_token_by_telegram_id(telegram_id=user_id)
     if not token:
         return "Токен не найден. Добавьте токен в настройках."
 
     async with TBankClient(token) as client:
-        accounts = await client.get_accounts()
+        accounts = await portfolio_cache.get_accounts(client)
 
         total_amount = 0.0
         message = ""
@@ -69,3 +75,18 @@ async def check_token(token: str) -> bool:
         return True
     except Exception:
         return False
+
+
+async def get_service_token() -> str | None:
+    """Возвращает токен для общих запросов, не привязанных к пользователю.
+
+    Используется токен из настроек, а если он не задан — токен одного из
+    активных пользователей.
+
+    Returns:
+        API токен или None, если подходящего токена нет
+
+    """
+    if config.tinvest_service_token:
+        return config.tinvest_service_token.get_secret_value()
+    return await BotUserStorage.get_any_token()
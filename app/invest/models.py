@@ -117,6 +117,21 @@ class BondsResponse(BaseModel):
     instruments: list[Bond] = []
 
 
+class LastPrice(BaseModel):
+    """Последняя цена инструмента."""
+
+    figi: str = ""
+    instrument_uid: str = Field(default="", alias="instrumentUid")
+    price: Quotation = Field(default_factory=Quotation)
+    time: datetime | None = None
+
+
+class GetLastPricesResponse(BaseModel):
+    """Ответ на запрос последних цен."""
+
+    last_prices: list[LastPrice] = Field(default_factory=list, alias="lastPrices")
+
+
 class EventType(str, Enum):
     """Типы событий по облигациям."""
 
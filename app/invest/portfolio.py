@@ -0,0 +1,191 @@
+"""Счета и позиции пользователя с кратковременным кэшем."""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+
+from core.config import config
+
+from .models import Account, GetPortfolioResponse, PortfolioPosition
+from .singleflight import SingleFlight
+from .tbank_client import TBankClient, make_token_key
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PortfolioItem:
+    """Позиция портфеля вместе со счётом, на котором она находится."""
+
+    account: Account
+    position: PortfolioPosition
+
+
+@dataclass
+class PortfolioSnapshot:
+    """Счета пользователя и их портфели на момент загрузки."""
+
+    accounts: list[Account]
+    portfolios: dict[str, GetPortfolioResponse]  # account_id -> портфель
+    failed_accounts: list[str] = field(default_factory=list)
+
+    def positions(self, instrument_type: str | None = "bond") -> list[PortfolioItem]:
+        """Возвращает позиции всех счетов в порядке счетов.
+
+        Args:
+            instrument_type: Тип инструмента для фильтрации (None - все позиции)
+
+        """
+        items: list[PortfolioItem] = []
+        for account in self.accounts:
+            portfolio = self.portfolios.get(account.id)
+            if portfolio is None:
+                continue
+            items.extend(
+                PortfolioItem(account=account, position=position)
+                for position in portfolio.positions
+                if instrument_type is None or position.instrument_type == instrument_type
+            )
+        return items
+
+
+class PortfolioCache:
+    """Кэш счетов и портфелей по токену с коротким TTL.
+
+    Повторные запросы одного пользователя в пределах TTL (кнопки подряд,
+    мониторинг цен сразу после просмотра) не обращаются к API, а
+    одновременная загрузка одного токена выполняется один раз. Снимок с
+    ошибкой по какому-либо счёту возвращается, но не сохраняется.
+    Кэшированные объекты общие для всех вызывающих - их нельзя изменять.
+    Общая загрузка открывает собственный клиент с тем же токеном: клиент
+    первого вызвавшего закрывается, если его отменят, а загрузка
+    продолжается для остальных.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        """Инициализирует кэш.
+
+        Args:
+            ttl: Время жизни записи в секундах
+
+        """
+        self.ttl = ttl
+        self._accounts: dict[str, tuple[float, list[Account]]] = {}
+        self._snapshots: dict[str, tuple[float, PortfolioSnapshot]] = {}
+        self._loads = SingleFlight()
+
+    async def get_accounts(self, client: TBankClient) -> list[Account]:
+        """Возвращает счета пользователя.
+
+        Args:
+            client: Открытый клиент T-Invest API
+
+        """
+        key = client.token_key
+        cached = self._get(self._accounts, key)
+        if cached is not None:
+            return cached
+
+        async def load() -> list[Account]:
+            async with TBankClient(client.token) as own_client:
+                accounts = await own_client.get_accounts()
+            self._put(self._accounts, key, accounts)
+            return accounts
+
+        return await self._loads.do(("accounts", key), load)
+
+    async def get_snapshot(self, client: TBankClient) -> PortfolioSnapshot:
+        """Возвращает счета и портфели пользователя.
+
+        Портфели всех счетов запрашиваются параллельно. Ошибка по одному
+        счёту не прерывает загрузку: счёт попадает в failed_accounts.
+
+        Args:
+            client: Открытый клиент T-Invest API
+
+        """
+        key = client.token_key
+        cached = self._get(self._snapshots, key)
+        if cached is not None:
+            return cached
+
+        async def load() -> PortfolioSnapshot:
+            async with TBankClient(client.token) as own_client:
+                accounts = await self.get_accounts(own_client)
+
+                async def fetch_portfolio(account: Account) -> GetPortfolioResponse | None:
+                    try:
+                        return await own_client.get_portfolio(account_id=account.id)
+                    except Exception as e:
+                        logger.error(f"Ошибка при получении портфеля счёта {account.id}: {e}")
+                        return None
+
+                results = await asyncio.gather(
+                    *(fetch_portfolio(account) for account in accounts)
+                )
+
+            snapshot = PortfolioSnapshot(accounts=accounts, portfolios={})
+            for account, portfolio in zip(accounts, results, strict=True):
+                if portfolio is None:
+                    snapshot.failed_accounts.append(account.id)
+                else:
+                    snapshot.portfolios[account.id] = portfolio
+
+            if not snapshot.failed_accounts:
+                self._put(self._snapshots, key, snapshot)
+            return snapshot
+
+        return await self._loads.do(("snapshot", key), load)
+
+    def invalidate(self, token: str) -> None:
+        """Удаляет данные токена из кэша (после добавления или удаления токена).
+
+        Args:
+            token: API токен T-Invest
+
+        """
+        key = make_token_key(token)
+        self._accounts.pop(key, None)
+        self._snapshots.pop(key, None)
+
+    def _get(self, storage: dict, key: str):
+        """Возвращает живую запись или None."""
+        entry = storage.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del storage[key]
+            return None
+        return value
+
+    def _put(self, storage: dict, key: str, value) -> None:
+        """Сохраняет запись, попутно удаляя истёкшие."""
+        now = time.monotonic()
+        for stale_key in [k for k, (expires_at, _) in storage.items() if expires_at < now]:
+            del storage[stale_key]
+        storage[key] = (now + self.ttl, value)
+
+
+portfolio_cache = PortfolioCache(ttl=config.portfolio_cache_ttl_seconds)
+
+
+async def collect_positions(
+    client: TBankClient, instrument_type: str | None = "bond"
+) -> list[PortfolioItem]:
+    """Возвращает позиции со всех счетов пользователя.
+
+    Ошибка получения портфеля одного счёта не прерывает сбор: счёт
+    пропускается, остальные позиции возвращаются.
+
+    Args:
+        client: Открытый клиент T-Invest API
+        instrument_type: Тип инструмента для фильтрации (None - все позиции)
+
+    Returns:
+        Позиции в порядке счетов
+
+    """
+    snapshot = await portfolio_cache.get_snapshot(client)
+    return snapshot.positions(instrument_type)
@@ -1,12 +1,22 @@
 """Модуль мониторинга цен облигаций."""
 
 import logging
+import math
+from abc import ABC, abstractmethod
+from array import array
 from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
 from enum import Enum
 
+from core.config import config
 from storage import AlertStorage, BotUserStorage
+from storage.alert_storage import MAX_DAILY_ALERTS
 
-from .tbank_client import TBankClient
+from .alert_state import alert_state
+from .bond_catalog import bond_catalog
+from .invest import get_service_token
+from .portfolio import portfolio_cache
+from .tbank_client import TBankAPIError, TBankClient
 
 logger = logging.getLogger(__name__)
 
@@ -20,17 +30,6 @@ class AlertType(Enum):
     RISE_CRITICAL = "rise_critical"
 
 
-@dataclass
-class BondPrice:
-    """Информация о цене облигации."""
-
-    figi: str
-    ticker: str
-    name: str
-    price_percent: float
-    account_name: str
-
-
 @dataclass
 class PriceAnomaly:
     """Информация об аномалии цены."""
@@ -45,174 +44,359 @@ class PriceAnomaly:
     account_name: str
 
 
-async def get_portfolio_bond_prices(telegram_id: int) -> list[BondPrice]:
-    """Получает текущие цены облигаций из портфеля пользователя.
+async def get_portfolio_bond_holdings(telegram_id: int) -> dict[str, str]:
+    """Получает облигации из портфеля пользователя.
 
     Args:
         telegram_id: ID пользователя в Telegram
 
     Returns:
-        Список объектов BondPrice с текущими ценами
+        Счета по figi облигации (через запятую, если облигация на нескольких счетах)
+
+    Raises:
+        TBankAPIError: Если портфель хотя бы одного счёта не получен - частичный
+            состав портфеля не должен заменять сохранённый
 
     """
     token = await BotUserStorage.get_token_by_telegram_id(telegram_id=telegram_id)
     if not token:
         logger.warning(f"Токен не найден для пользователя {telegram_id}")
-        return []
+        return {}
 
-    bond_prices: list[BondPrice] = []
+    accounts_by_figi: dict[str, list[str]] = {}
+    async with TBankClient(token) as client:
+        # Справочник облигаций по figi из общего кэша
+        bonds_cache = await bond_catalog.get_bonds(client)
 
-    try:
-        async with TBankClient(token) as client:
-            # Получаем все облигации для кэша
-            all_bonds = await client.get_bonds()
-            bonds_cache = {bond.figi: bond for bond in all_bonds}
+        snapshot = await portfolio_cache.get_snapshot(client)
+        if snapshot.failed_accounts:
+            raise TBankAPIError(f"Не получены портфели счетов: {snapshot.failed_accounts}")
 
-            accounts = await client.get_accounts()
+        for item in snapshot.positions("bond"):
+            if item.position.figi in bonds_cache:
+                accounts_by_figi.setdefault(item.position.figi, []).append(item.account.name)
 
-            for account in accounts:
-                try:
-                    portfolio = await client.get_portfolio(account_id=account.id)
+    return {figi: ", ".join(accounts)[:255] for figi, accounts in accounts_by_figi.items()}
 
-                    for position in portfolio.positions:
-                        if position.instrument_type != "bond":
-                            continue
 
-                        bond = bonds_cache.get(position.figi)
-                        if not bond:
-                            continue
+async def get_market_bond_prices(figis: list[str]) -> dict[str, float]:
+    """Получает текущие рыночные цены облигаций одним пакетом запросов.
 
-                        # Цена в процентах от номинала
-                        current_price = position.current_price.to_float()
-
-                        bond_prices.append(
-                            BondPrice(
-                                figi=position.figi,
-                                ticker=bond.ticker,
-                                name=bond.name,
-                                price_percent=current_price,
-                                account_name=account.name,
-                            )
-                        )
-
-                except Exception as e:
-                    logger.error(f"Ошибка при получении портфеля счёта {account.id}: {e}")
-                    continue
-
-    except Exception as e:
-        logger.error(f"Ошибка при получении цен облигаций для пользователя {telegram_id}: {e}")
-
-    return bond_prices
-
-
-def detect_anomalies(
-    current_prices: list[BondPrice],
-    previous_prices: list,
-    settings,
-) -> list[PriceAnomaly]:
-    """Находит аномалии в изменении цен.
+    Цены общие для всех пользователей, поэтому запрашиваются токеном для
+    общих запросов. API возвращает цену облигации в процентах от номинала;
+    она пересчитывается в цену одной бумаги в валюте номинала - в тех же
+    единицах, что и прежние цены из портфеля (currentPrice), с которыми
+    сравниваются новые.
 
     Args:
-        current_prices: Текущие цены облигаций
-        previous_prices: Предыдущие цены из БД
-        settings: Настройки уведомлений пользователя
+        figis: FIGI облигаций
 
     Returns:
-        Список найденных аномалий
+        Цена одной бумаги по figi (бумаги без сделок и вне справочника пропускаются)
 
     """
-    anomalies: list[PriceAnomaly] = []
+    if not figis:
+        return {}
 
-    # Создаём словарь предыдущих цен по figi
-    prev_prices_map = {p.figi: p for p in previous_prices}
-
-    for current in current_prices:
-        prev = prev_prices_map.get(current.figi)
-        if not prev:
-            # Новая облигация, нет предыдущей цены для сравнения
+    token = await get_service_token()
+    if not token:
+        logger.warning("Нет токена для запроса рыночных цен облигаций")
+        return {}
+
+    async with TBankClient(token) as client:
+        bonds_cache = await bond_catalog.get_bonds(client)
+        last_prices = await client.get_last_prices(figis)
+
+    prices: dict[str, float] = {}
+    for last_price in last_prices:
+        bond = bonds_cache.get(last_price.figi)
+        percent = last_price.price.to_float()
+        if bond is None or percent <= 0:
             continue
+        prices[last_price.figi] = percent * bond.nominal.to_float() / 100
+    return prices
 
-        # Вычисляем процент изменения
-        old_price = prev.price_percent
-        new_price = current.price_percent
 
-        if old_price == 0:
-            continue
-
-        change_percent = ((new_price - old_price) / old_price) * 100
-
-        alert_type = None
-
-        # Проверяем падение
-        if change_percent < 0:
-            abs_change = abs(change_percent)
-            if abs_change >= settings.drop_critical_threshold:
-                alert_type = AlertType.DROP_CRITICAL
-            elif abs_change >= settings.drop_warning_threshold:
-                alert_type = AlertType.DROP_WARNING
-
-        # Проверяем рост
-        elif change_percent > 0:
-            if change_percent >= settings.rise_critical_threshold:
-                alert_type = AlertType.RISE_CRITICAL
-            elif change_percent >= settings.rise_warning_threshold:
-                alert_type = AlertType.RISE_WARNING
-
-        if alert_type:
-            anomalies.append(
-                PriceAnomaly(
-                    figi=current.figi,
-                    ticker=current.ticker,
-                    name=current.name,
-                    old_price=old_price,
-                    new_price=new_price,
-                    change_percent=change_percent,
-                    alert_type=alert_type,
-                    account_name=current.account_name,
-                )
-            )
-
-    return anomalies
-
-
-async def should_send_alert(telegram_id: int, anomaly: PriceAnomaly) -> bool:
-    """Проверяет, нужно ли отправлять алерт с учётом anti-spam правил.
+async def filter_alerts_to_send(
+    telegram_id: int, anomalies: list[PriceAnomaly]
+) -> list[PriceAnomaly]:
+    """Отбирает аномалии, по которым можно отправить алерт с учётом anti-spam правил.
 
     Правила:
     1. Cooldown 4 часа между алертами по одной бумаге
     2. После warning только critical (эскалация)
     3. Максимум 10 уведомлений в день
 
+    Правила проверяются по состоянию в памяти (alert_state), без запросов к
+    БД. Каждая аномалия оценивается независимо, как при отдельной проверке.
+
     Args:
         telegram_id: ID пользователя
-        anomaly: Информация об аномалии
+        anomalies: Найденные аномалии
 
     Returns:
-        True если алерт можно отправить
+        Аномалии, по которым алерт можно отправить
 
     """
+    if not anomalies:
+        return []
+
     # Проверяем дневной лимит
-    if not await AlertStorage.can_send_more_alerts_today(telegram_id):
+    if alert_state.daily_count(telegram_id) >= MAX_DAILY_ALERTS:
         logger.debug(f"Превышен дневной лимит алертов для пользователя {telegram_id}")
-        return False
-
-    # Проверяем cooldown
-    if not await AlertStorage.can_send_alert(telegram_id, anomaly.figi):
-        # Проверяем эскалацию: если последний был warning, а текущий critical - разрешаем
-        last_type = await AlertStorage.get_last_alert_type(telegram_id, anomaly.figi)
-        if last_type:
-            is_escalation = (
-                (last_type == AlertType.DROP_WARNING.value
-                 and anomaly.alert_type == AlertType.DROP_CRITICAL)
-                or
-                (last_type == AlertType.RISE_WARNING.value
-                 and anomaly.alert_type == AlertType.RISE_CRITICAL)
-            )
-            if is_escalation:
-                logger.debug(f"Разрешаем эскалацию алерта для {anomaly.figi}")
-                return True
-
-        logger.debug(f"Cooldown активен для {anomaly.figi}")
-        return False
-
-    return True
+        return []
+
+    allowed: list[PriceAnomaly] = []
+    for anomaly in anomalies:
+        last_type = alert_state.last_alert_type(telegram_id, anomaly.figi)
+        if last_type is None:
+            allowed.append(anomaly)
+            continue
+
+        # Cooldown активен: если последний был warning, а текущий critical - разрешаем
+        is_escalation = (
+            (last_type == AlertType.DROP_WARNING.value
+             and anomaly.alert_type == AlertType.DROP_CRITICAL)
+            or
+            (last_type == AlertType.RISE_WARNING.value
+             and anomaly.alert_type == AlertType.RISE_CRITICAL)
+        )
+        if is_escalation:
+            logger.debug(f"Разрешаем эскалацию алерта для {anomaly.figi}")
+            allowed.append(anomaly)
+        else:
+            logger.debug(f"Cooldown активен для {anomaly.figi}")
+
+    return allowed
+
+
+# === Детекторы по скользящей статистике цен ===
+
+
+class DetectorType(Enum):
+    """Способ расчёта базовой цены, с которой сравнивается текущая."""
+
+    SNAPSHOT = "snapshot"  # цена предыдущего прогона
+    EWMA = "ewma"  # экспоненциальное скользящее среднее
+    ZSCORE = "zscore"  # скользящее среднее, только при выбросе по z-score
+
+
+DETECTOR_LABELS = {
+    DetectorType.SNAPSHOT.value: "изменение с прошлой проверки",
+    DetectorType.EWMA.value: "отклонение от сглаженной цены (EWMA)",
+    DetectorType.ZSCORE.value: "выброс относительно среднего (z-score)",
+}
+
+
+class PriceWindow:
+    """Кольцевой буфер последних цен облигации.
+
+    Сумма цен в окне и EWMA обновляются за O(1) на цену. Сумма
+    пересчитывается заново при каждом полном обороте буфера, чтобы не
+    накапливалась ошибка округления. Стандартное отклонение считается в два
+    прохода по буферу: формула через сумму квадратов на ровном окне даёт
+    ложный разброс от вычитания близких чисел.
+    """
+
+    __slots__ = ("alpha", "count", "ewma", "_next", "_sum", "_values")
+
+    def __init__(self, size: int, alpha: float) -> None:
+        """Инициализирует пустое окно.
+
+        Args:
+            size: Размер окна (количество цен)
+            alpha: Коэффициент сглаживания EWMA (0..1)
+
+        """
+        self.alpha = alpha
+        self.count = 0
+        self.ewma: float | None = None
+        self._next = 0
+        self._sum = 0.0
+        self._values = array("d", bytes(8 * size))
+
+    def push(self, price: float) -> None:
+        """Добавляет цену, вытесняя самую старую при заполненном окне."""
+        size = len(self._values)
+        if self.count == size:
+            old = self._values[self._next]
+            self._sum -= old
+        else:
+            self.count += 1
+        self._values[self._next] = price
+        self._next = (self._next + 1) % size
+        self._sum += price
+        if self._next == 0:
+            self._sum = math.fsum(self._values[: self.count])
+
+        self.ewma = (
+            price if self.ewma is None else self.alpha * price + (1 - self.alpha) * self.ewma
+        )
+
+    @property
+    def mean(self) -> float:
+        """Среднее цен в окне."""
+        return self._sum / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        """Стандартное отклонение цен в окне."""
+        if not self.count:
+            return 0.0
+        mean = self.mean
+        values = self._values[: self.count]
+        return math.sqrt(sum((value - mean) ** 2 for value in values) / self.count)
+
+
+class PriceDetector(ABC):
+    """Детектор: базовая цена облигации по её окну для сравнения с текущей ценой."""
+
+    detector_type: DetectorType
+
+    @abstractmethod
+    def baseline(self, window: PriceWindow, price: float) -> float | None:
+        """Возвращает базовую цену или None, если сравнивать не с чем.
+
+        Args:
+            window: Окно прошлых цен облигации (без текущей)
+            price: Текущая цена
+
+        """
+
+
+class EwmaDetector(PriceDetector):
+    """Сравнение с EWMA: медленное сползание цены накапливает отклонение."""
+
+    detector_type = DetectorType.EWMA
+
+    def __init__(self, min_points: int) -> None:
+        """Инициализирует детектор.
+
+        Args:
+            min_points: Минимум цен в окне для сравнения
+
+        """
+        self.min_points = min_points
+
+    def baseline(self, window: PriceWindow, price: float) -> float | None:
+        """Возвращает EWMA прошлых цен."""
+        if window.count < self.min_points:
+            return None
+        return window.ewma
+
+
+# Относительный разброс окна, ниже которого окно считается ровным
+FLAT_WINDOW_TOLERANCE = 1e-9
+
+
+class ZScoreDetector(PriceDetector):
+    """Сравнение со средним окна только для выбросов: шум в пределах окна не алертит."""
+
+    detector_type = DetectorType.ZSCORE
+
+    def __init__(self, min_points: int, z_threshold: float) -> None:
+        """Инициализирует детектор.
+
+        Args:
+            min_points: Минимум цен в окне для сравнения
+            z_threshold: Минимальный |z-score| текущей цены
+
+        """
+        self.min_points = min_points
+        self.z_threshold = z_threshold
+
+    def baseline(self, window: PriceWindow, price: float) -> float | None:
+        """Возвращает среднее окна, если текущая цена - выброс.
+
+        На ровном окне (разброс в пределах округления относительно среднего)
+        выбросом считается любое отклонение: GetLastPrices подолгу отдаёт одну
+        и ту же цену последней сделки неликвидных облигаций.
+        """
+        if window.count < self.min_points:
+            return None
+        mean, std = window.mean, window.std
+        if std <= FLAT_WINDOW_TOLERANCE * abs(mean):
+            return mean
+        if abs(price - mean) / std < self.z_threshold:
+            return None
+        return mean
+
+
+class PriceStatistics:
+    """Окна последних рыночных цен по figi в памяти.
+
+    При старте окна заполняются из bond_price_history, затем пополняются
+    каждым прогоном мониторинга. Детектор snapshot окна не использует:
+    его базовая цена - последняя сохранённая (bond_latest_price).
+    """
+
+    def __init__(self, size: int, alpha: float, detectors: list[PriceDetector]) -> None:
+        """Инициализирует пустую статистику.
+
+        Args:
+            size: Размер окна цен облигации
+            alpha: Коэффициент сглаживания EWMA
+            detectors: Детекторы по скользящей статистике
+
+        """
+        self.size = size
+        self.alpha = alpha
+        self.detectors = detectors
+        self._windows: dict[str, PriceWindow] = {}
+
+    async def load(self) -> None:
+        """Заполняет окна из истории цен за период хранения."""
+        since = datetime.now(UTC) - timedelta(days=config.history_retention_days)
+        history = await AlertStorage.get_price_history(since, self.size)
+        self._windows.clear()
+        for figi, price, _recorded_at in history:
+            self._window(figi).push(price)
+        logger.info(
+            f"Статистика цен восстановлена: {len(history)} цен, {len(self._windows)} облигаций"
+        )
+
+    def baselines(self, prices: dict[str, float]) -> dict[str, dict[str, float]]:
+        """Возвращает базовые цены детекторов для текущих цен.
+
+        Args:
+            prices: Текущие цены по figi (ещё не добавленные в окна)
+
+        Returns:
+            Базовые цены по figi для каждого детектора (по значению DetectorType)
+
+        """
+        result: dict[str, dict[str, float]] = {}
+        for detector in self.detectors:
+            detector_baselines = result.setdefault(detector.detector_type.value, {})
+            for figi, price in prices.items():
+                window = self._windows.get(figi)
+                if window is None:
+                    continue
+                baseline = detector.baseline(window, price)
+                if baseline is not None:
+                    detector_baselines[figi] = baseline
+        return result
+
+    def update(self, prices: dict[str, float]) -> None:
+        """Добавляет текущие цены в окна."""
+        for figi, price in prices.items():
+            self._window(figi).push(price)
+
+    def _window(self, figi: str) -> PriceWindow:
+        """Возвращает окно облигации, создавая его при необходимости."""
+        window = self._windows.get(figi)
+        if window is None:
+            window = self._windows[figi] = PriceWindow(self.size, self.alpha)
+        return window
+
+
+price_statistics = PriceStatistics(
+    size=config.price_window_size,
+    alpha=config.price_ewma_alpha,
+    detectors=[
+        EwmaDetector(min_points=config.price_stats_min_points),
+        ZScoreDetector(
+            min_points=config.price_stats_min_points, z_threshold=config.price_zscore_threshold
+        ),
+    ],
+)
@@ -0,0 +1,123 @@
+"""Ограничение частоты запросов к T-Invest API."""
+
+import asyncio
+import logging
+import time
+from collections.abc import Mapping
+
+logger = logging.getLogger(__name__)
+
+# Лимиты запросов в минуту на один токен по документации T-Invest API
+SERVICE_LIMITS: dict[str, int] = {
+    "UsersService": 100,
+    "OperationsService": 200,
+    "InstrumentsService": 200,
+    "MarketDataService": 600,
+}
+DEFAULT_LIMIT = 100
+
+
+class TokenBucket:
+    """Token bucket для одного сервиса API в рамках одного токена."""
+
+    def __init__(self, limit_per_minute: int) -> None:
+        """Инициализирует заполненный bucket.
+
+        Args:
+            limit_per_minute: Допустимое количество запросов в минуту
+
+        """
+        self.capacity = float(limit_per_minute)
+        self.fill_rate = limit_per_minute / 60
+        self.tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        """Пополняет bucket за прошедшее время."""
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.fill_rate)
+        self._updated_at = now
+
+    async def acquire(self) -> None:
+        """Ждёт, пока запрос можно будет отправить, и списывает один токен."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.fill_rate
+                await asyncio.sleep(wait)
+
+    def block(self, seconds: float) -> None:
+        """Запрещает запросы на заданное время (например, после ответа 429)."""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = 0.0
+        self._blocked_until = max(self._blocked_until, now + seconds)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """Синхронизирует состояние с заголовками x-ratelimit-* ответа API."""
+        remaining = _parse_number(headers.get("x-ratelimit-remaining"))
+        if remaining is None:
+            return
+
+        reset = _parse_number(headers.get("x-ratelimit-reset"))
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, remaining)
+        if remaining <= 0 and reset:
+            self.block(reset)
+
+
+class RateLimiterRegistry:
+    """Реестр bucket'ов по токену и сервису, общий для всех клиентов процесса."""
+
+    def __init__(self, limits: Mapping[str, int], default_limit: int = DEFAULT_LIMIT) -> None:
+        """Инициализирует реестр.
+
+        Args:
+            limits: Лимиты запросов в минуту по имени сервиса
+            default_limit: Лимит для сервисов, которых нет в limits
+
+        """
+        self.limits = dict(limits)
+        self.default_limit = default_limit
+        self._buckets: dict[tuple[str, str], TokenBucket] = {}
+
+    def get(self, token_key: str, service: str) -> TokenBucket:
+        """Возвращает bucket для пары (токен, сервис).
+
+        Args:
+            token_key: Хэш токена (сам токен в реестре не хранится)
+            service: Имя сервиса API
+
+        """
+        key = (token_key, service)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.limits.get(service, self.default_limit))
+            self._buckets[key] = bucket
+        return bucket
+
+
+def get_service_name(endpoint: str) -> str:
+    """Возвращает имя сервиса из пути endpoint, например 'InstrumentsService'."""
+    return endpoint.split("/", 1)[0].rsplit(".", 1)[-1]
+
+
+def _parse_number(value: str | None) -> float | None:
+    """Парсит числовое значение заголовка."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+rate_limiter = RateLimiterRegistry(SERVICE_LIMITS)
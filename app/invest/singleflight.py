@@ -0,0 +1,54 @@
+"""Объединение одинаковых одновременных запросов (singleflight)."""
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+
+class SingleFlight:
+    """Выполняет одинаковые одновременные вызовы один раз.
+
+    Пока вызов с некоторым ключом выполняется, остальные вызовы с тем же
+    ключом не идут в API, а ждут и получают тот же результат (или ошибку).
+    """
+
+    def __init__(self) -> None:
+        """Инициализирует пустой реестр вызовов."""
+        self._calls: dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Выполняет func или присоединяется к уже выполняющемуся вызову с тем же ключом.
+
+        Args:
+            key: Ключ вызова
+            func: Фабрика корутины, выполняющей вызов
+
+        Returns:
+            Результат вызова
+
+        """
+        task = self._calls.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.hits += 1
+
+        # shield: отмена одного ожидающего не отменяет вызов для остальных
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict[str, int]:
+        """Возвращает счётчики объединённых (hits) и реальных (misses) вызовов."""
+        return {"hits": self.hits, "misses": self.misses, "in_flight": len(self._calls)}
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        """Удаляет завершённый вызов из реестра."""
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Помечаем ошибку как полученную, если все ожидающие были отменены
+        if not task.cancelled():
+            task.exception()
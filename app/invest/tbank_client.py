@@ -1,14 +1,19 @@
 """REST клиент для T-Invest API."""
 
 import asyncio
+import hashlib
+import json
 import logging
 import ssl
 from datetime import datetime
-from typing import Any
+from typing import TypeVar
 
 import aiohttp
 import certifi
+from core.config import config
+from pydantic import BaseModel
 
+from .decoding import ParseExecutor, loads
 from .models import (
     Account,
     Bond,
@@ -17,25 +22,101 @@ from .models import (
     EventType,
     GetAccountsResponse,
     GetBondEventsResponse,
+    GetLastPricesResponse,
     GetOperationsResponse,
     GetPortfolioResponse,
+    LastPrice,
     Operation,
     UserInfo,
 )
+from .rate_limiter import get_service_name, rate_limiter
+from .singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+M = TypeVar("M", bound=BaseModel)
+
 BASE_URL = "https://invest-public-api.tinkoff.ru/rest"
 
+# Сервисы с общими для всех пользователей данными: одинаковые запросы
+# объединяются между токенами, для остальных - только в рамках одного токена
+PUBLIC_SERVICES = frozenset({"InstrumentsService", "MarketDataService"})
+
+
+def make_token_key(token: str) -> str:
+    """Возвращает ключ токена для лимитов и кэшей, не раскрывающий сам токен."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
 
 class TBankAPIError(Exception):
     """Ошибка API T-Invest."""
 
-    def __init__(self, message: str, code: str = ""):
+    def __init__(self, message: str, code: str = "", status: int = 0):
         self.message = message
         self.code = code
+        self.status = status
         super().__init__(f"{code}: {message}" if code else message)
 
+    @property
+    def is_client_error(self) -> bool:
+        """Ответ API с HTTP статусом 4xx (авторизация, права, параметры, лимит)."""
+        return 400 <= self.status < 500
+
+
+class HTTPTransport:
+    """Общий пул HTTP соединений к T-Invest API на всё время работы приложения.
+
+    SSL контекст, коннектор и сессия создаются один раз, поэтому keep-alive
+    соединения и DNS кэш переиспользуются всеми клиентами. Авторизация
+    передаётся в заголовках каждого запроса.
+    """
+
+    def __init__(self) -> None:
+        """Инициализирует транспорт без открытой сессии."""
+        self._session: aiohttp.ClientSession | None = None
+        self._lock = asyncio.Lock()
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Возвращает общую сессию, создавая её при первом обращении."""
+        if self._session is not None and not self._session.closed:
+            return self._session
+
+        async with self._lock:
+            if self._session is None or self._session.closed:
+                # Создаём SSL контекст с актуальными сертификатами
+                ssl_context = ssl.create_default_context(cafile=certifi.where())
+
+                connector = aiohttp.TCPConnector(
+                    ssl=ssl_context,
+                    limit=config.tinvest_pool_limit,
+                    limit_per_host=config.tinvest_pool_limit_per_host,
+                    ttl_dns_cache=config.tinvest_dns_ttl,
+                    keepalive_timeout=config.tinvest_keepalive_timeout,
+                )
+                self._session = aiohttp.ClientSession(
+                    connector=connector,
+                    headers={"Content-Type": "application/json"},
+                    timeout=aiohttp.ClientTimeout(total=config.tinvest_request_timeout),
+                )
+                logger.info("HTTP пул соединений T-Invest API создан")
+        return self._session
+
+    async def close(self) -> None:
+        """Закрывает общую сессию и все соединения пула."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("HTTP пул соединений T-Invest API закрыт")
+        self._session = None
+
+
+http_transport = HTTPTransport()
+request_coalescer = SingleFlight()
+parse_executor = ParseExecutor(
+    kind=config.tinvest_parse_executor,
+    threshold=config.tinvest_parse_offload_bytes,
+    max_workers=config.tinvest_parse_workers,
+)
+
 
 class TBankClient:
     """Асинхронный REST клиент для T-Invest API."""
@@ -48,55 +129,110 @@ class TBankClient:
 
         """
         self.token = token
+        self.token_key = make_token_key(token)
+        self._headers = {"Authorization": f"Bearer {token}"}
         self._session: aiohttp.ClientSession | None = None
 
     async def __aenter__(self) -> "TBankClient":
         """Вход в контекстный менеджер."""
-        # Создаём SSL контекст с актуальными сертификатами
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
-        self._session = aiohttp.ClientSession(
-            connector=connector,
-            headers={
-                "Authorization": f"Bearer {self.token}",
-                "Content-Type": "application/json",
-            },
-        )
+        self._session = await http_transport.get_session()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
-        """Выход из контекстного менеджера."""
-        if self._session:
-            await self._session.close()
-            self._session = None
+        """Выход из контекстного менеджера.
+
+        Общая сессия не закрывается: она живёт до остановки бота.
+        """
+        self._session = None
 
     async def _request(
-        self, endpoint: str, data: dict | None = None, max_retries: int = 3
-    ) -> dict[str, Any]:
-        """Выполняет POST запрос к API с retry для 5xx ошибок.
+        self,
+        endpoint: str,
+        model: type[M],
+        data: dict | None = None,
+        max_retries: int = 3,
+    ) -> M:
+        """Выполняет POST запрос к API, объединяя одинаковые одновременные запросы.
+
+        Все методы клиента только читают данные, поэтому одновременные запросы
+        с одинаковыми endpoint и телом получают один общий ответ. Для
+        пользовательских данных в ключ входит токен. Общий запрос публичных
+        данных выполняется с токеном первого вызвавшего: если API отклонил
+        его (4xx), остальные повторяют запрос со своим токеном.
 
         Args:
             endpoint: Путь endpoint (без base URL)
+            model: Модель ответа
             data: Тело запроса
             max_retries: Максимальное количество повторных попыток
 
         Returns:
-            JSON ответ
+            Ответ, декодированный в модель (общий для объединённых вызовов, не изменять)
+
+        Raises:
+            TBankAPIError: При ошибке API
+
+        """
+        payload = data or {}
+        service = get_service_name(endpoint)
+        scope = "public" if service in PUBLIC_SERVICES else self.token_key
+        key = (endpoint, json.dumps(payload, sort_keys=True), scope, model.__name__)
+
+        own_call = False
+
+        async def call() -> M:
+            nonlocal own_call
+            own_call = True
+            raw = await self._send(endpoint, payload, max_retries)
+            return await parse_executor.decode(raw, model, config.tinvest_json_backend)
+
+        try:
+            return await request_coalescer.do(key, call)
+        except TBankAPIError as e:
+            if own_call or not e.is_client_error:
+                raise
+            logger.debug(f"Общий запрос {endpoint} отклонён ({e.status}), повтор со своим токеном")
+            return await request_coalescer.do((*key[:2], self.token_key, key[3]), call)
+
+    async def _send(self, endpoint: str, payload: dict, max_retries: int) -> bytes:
+        """Выполняет POST запрос к API с учётом лимитов и retry для 5xx/429 ошибок.
+
+        Args:
+            endpoint: Путь endpoint (без base URL)
+            payload: Тело запроса
+            max_retries: Максимальное количество повторных попыток
+
+        Returns:
+            Тело ответа (JSON) без разбора
 
         Raises:
             TBankAPIError: При ошибке API
 
         """
-        if not self._session:
+        session = self._session
+        if not session:
             raise RuntimeError("Client not initialized. Use 'async with' context manager.")
 
         url = f"{BASE_URL}/{endpoint}"
-        payload = data or {}
+        bucket = rate_limiter.get(self.token_key, get_service_name(endpoint))
 
         for attempt in range(max_retries):
+            await bucket.acquire()
             try:
-                async with self._session.post(url, json=payload) as response:
+                async with session.post(url, json=payload, headers=self._headers) as response:
+                    bucket.update_from_headers(response.headers)
+
+                    # Превышен лимит - ждём сброса квоты и повторяем
+                    if response.status == 429 and attempt < max_retries - 1:
+                        reset = response.headers.get("x-ratelimit-reset", "")
+                        delay = float(reset) if reset.isdigit() else 1.0
+                        logger.warning(
+                            f"Rate limit exceeded for {endpoint}, retrying in {delay}s "
+                            f"(attempt {attempt + 1}/{max_retries})"
+                        )
+                        bucket.block(delay)
+                        continue
+
                     # Для 5xx ошибок - retry с задержкой
                     if response.status >= 500:
                         body = await response.text()
@@ -118,18 +254,19 @@ class TBankClient:
                         logger.error(f"Unexpected content type: {content_type}, body: {body[:200]}")
                         raise TBankAPIError(f"Unexpected content type: {content_type}")
 
-                    result = await response.json()
+                    raw = await response.read()
 
                     if response.status != 200:
+                        result = loads(raw)
                         error_msg = result.get("message", "Unknown error")
                         error_code = result.get("code", "")
                         logger.error(
                             f"API error: endpoint={endpoint}, code={error_code}, "
                             f"message={error_msg}, payload={payload}, full_response={result}"
                         )
-                        raise TBankAPIError(error_msg, str(error_code))
+                        raise TBankAPIError(error_msg, str(error_code), response.status)
 
-                    return result
+                    return raw
 
             except aiohttp.ClientError as e:
                 if attempt < max_retries - 1:
@@ -147,15 +284,13 @@ class TBankClient:
     async def get_accounts(self) -> list[Account]:
         """Получает список счетов пользователя."""
         endpoint = "tinkoff.public.invest.api.contract.v1.UsersService/GetAccounts"
-        result = await self._request(endpoint)
-        response = GetAccountsResponse(**result)
+        response = await self._request(endpoint, GetAccountsResponse)
         return response.accounts
 
     async def get_info(self) -> UserInfo:
         """Получает информацию о пользователе."""
         endpoint = "tinkoff.public.invest.api.contract.v1.UsersService/GetInfo"
-        result = await self._request(endpoint)
-        return UserInfo(**result)
+        return await self._request(endpoint, UserInfo)
 
     # === OperationsService ===
 
@@ -184,8 +319,7 @@ class TBankClient:
             "to": to.isoformat() + "Z",
         }
 
-        result = await self._request(endpoint, data)
-        response = GetOperationsResponse(**result)
+        response = await self._request(endpoint, GetOperationsResponse, data)
         return response.operations
 
     async def get_portfolio(self, account_id: str) -> GetPortfolioResponse:
@@ -197,8 +331,30 @@ class TBankClient:
         """
         endpoint = "tinkoff.public.invest.api.contract.v1.OperationsService/GetPortfolio"
         data = {"accountId": account_id}
-        result = await self._request(endpoint, data)
-        return GetPortfolioResponse(**result)
+        return await self._request(endpoint, GetPortfolioResponse, data)
+
+    # === MarketDataService ===
+
+    async def get_last_prices(self, figis: list[str]) -> list[LastPrice]:
+        """Получает последние цены инструментов.
+
+        Запросы отправляются пачками по tinvest_last_prices_batch_size
+        инструментов. Для облигаций цена - в процентах от номинала.
+
+        Args:
+            figis: FIGI инструментов
+
+        """
+        endpoint = "tinkoff.public.invest.api.contract.v1.MarketDataService/GetLastPrices"
+        size = config.tinvest_last_prices_batch_size
+        batches = [figis[i : i + size] for i in range(0, len(figis), size)]
+        responses = await asyncio.gather(
+            *(
+                self._request(endpoint, GetLastPricesResponse, {"instrumentId": batch})
+                for batch in batches
+            )
+        )
+        return [price for response in responses for price in response.last_prices]
 
     # === InstrumentsService ===
 
@@ -211,8 +367,7 @@ class TBankClient:
         """
         endpoint = "tinkoff.public.invest.api.contract.v1.InstrumentsService/Bonds"
         data = {"instrumentStatus": instrument_status}
-        result = await self._request(endpoint, data)
-        response = BondsResponse(**result)
+        response = await self._request(endpoint, BondsResponse, data)
         return response.instruments
 
     async def get_bond_events(
@@ -242,6 +397,5 @@ class TBankClient:
             "type": event_type.value,
         }
 
-        result = await self._request(endpoint, data)
-        response = GetBondEventsResponse(**result)
+        response = await self._request(endpoint, GetBondEventsResponse, data)
         return response.events
@@ -114,6 +114,12 @@ class KeyboardHelper:
                 callback_data=CallbackData.PRICE_ALERTS_RISE_CRITICAL.value,
             )
         )
+        builder.add(
+            InlineKeyboardButton(
+                text="Сменить детектор",
+                callback_data=CallbackData.PRICE_ALERTS_DETECTOR.value,
+            )
+        )
         builder.add(
             InlineKeyboardButton(
                 text=ButtonTexts.BACK_TO_SETTINGS.value,
@@ -121,7 +127,7 @@ class KeyboardHelper:
             )
         )
 
-        builder.adjust(2, 2, 1)
+        builder.adjust(2, 2, 1, 1)
         return builder
 
     @staticmethod
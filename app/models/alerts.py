@@ -3,7 +3,7 @@
 from datetime import datetime
 
 from models.base import Base
-from sqlalchemy import BigInteger, Boolean, DateTime, Float, Integer, String, func
+from sqlalchemy import BigInteger, Boolean, DateTime, Float, Index, Integer, String, func
 from sqlalchemy.orm import Mapped, mapped_column
 
 
@@ -26,6 +26,11 @@ class UserAlertSettings(Base):
     rise_warning_threshold: Mapped[float] = mapped_column(Float, default=3.0)
     rise_critical_threshold: Mapped[float] = mapped_column(Float, default=7.0)
 
+    # Детектор аномалий (значение DetectorType): с чем сравнивается текущая цена
+    detector: Mapped[str] = mapped_column(
+        String(16), default="snapshot", server_default="snapshot", nullable=False
+    )
+
     # Метаданные
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime | None] = mapped_column(
@@ -38,12 +43,24 @@ class UserAlertSettings(Base):
 
 
 class BondPriceHistory(Base):
-    """История цен облигаций для сравнения."""
+    """История рыночных цен облигаций: одна запись на figi за прогон мониторинга."""
 
     __tablename__ = "bond_price_history"
-
+    # Суточные секции по recorded_at (см. core.partitions). При переносе из
+    # прежней таблицы с ценами по пользователям дубли схлопываются до одной
+    # цены на figi за прогон: снимок каждого пользователя сохранялся своей
+    # транзакцией со своим recorded_at, а прогоны идут раз в час
+    __table_args__ = {
+        "postgresql_partition_by": "RANGE (recorded_at)",
+        "info": {
+            "partition_column": "recorded_at",
+            "legacy_distinct_on": ["figi", "date_trunc('hour', recorded_at)"],
+            "legacy_order_by": "recorded_at",
+        },
+    }
+
+    # Ключ секционированной таблицы должен включать колонку секционирования
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    telegram_id: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
 
     # Идентификаторы облигации
     figi: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
@@ -53,31 +70,92 @@ class BondPriceHistory(Base):
     # Цена в процентах от номинала
     price_percent: Mapped[float] = mapped_column(Float, nullable=False)
 
-    # Счёт
-    account_name: Mapped[str] = mapped_column(String(255), nullable=True)
+    # Время записи
+    recorded_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True, server_default=func.now()
+    )
+
+    def __repr__(self) -> str:
+        """Представление модели."""
+        return f"<BondPriceHistory(figi={self.figi}, price={self.price_percent}%)>"
+
+
+class BondLatestPrice(Base):
+    """Последняя сохранённая рыночная цена облигации.
+
+    Обновляется вместе с записью в bond_price_history, чтобы сравнение цен
+    было поиском по первичному ключу, а не агрегацией по истории.
+    """
+
+    __tablename__ = "bond_latest_price"
+    # Прежняя таблица с ценами по пользователям не переносится: после
+    # пересоздания она заполняется из истории (backfill_latest_prices)
+    __table_args__ = {"info": {"rebuild": True, "legacy_copy": False}}
+
+    figi: Mapped[str] = mapped_column(String(64), primary_key=True)
+    ticker: Mapped[str] = mapped_column(String(32), nullable=False)
+    name: Mapped[str] = mapped_column(String(255), nullable=False)
+
+    # Цена в процентах от номинала
+    price_percent: Mapped[float] = mapped_column(Float, nullable=False)
 
     # Время записи
     recorded_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     def __repr__(self) -> str:
         """Представление модели."""
-        return f"<BondPriceHistory(figi={self.figi}, price={self.price_percent}%)>"
+        return f"<BondLatestPrice(figi={self.figi}, price={self.price_percent}%)>"
+
+
+class UserBondHolding(Base):
+    """Облигации в портфеле пользователя на момент последней проверки цен."""
+
+    __tablename__ = "user_bond_holdings"
+
+    telegram_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    figi: Mapped[str] = mapped_column(String(64), primary_key=True, index=True)
+
+    # Счета, на которых лежит облигация (через запятую)
+    account_name: Mapped[str] = mapped_column(String(255), nullable=True)
+
+    # Время обновления
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self) -> str:
+        """Представление модели."""
+        return f"<UserBondHolding(telegram_id={self.telegram_id}, figi={self.figi})>"
 
 
 class SentAlert(Base):
     """Отправленные алерты (для anti-spam)."""
 
     __tablename__ = "sent_alerts"
+    # Суточные секции по sent_at (см. core.partitions); составной индекс
+    # покрывает anti-spam выборку алертов пользователя за период и поиск по
+    # telegram_id, поэтому отдельный индекс по telegram_id не нужен
+    __table_args__ = (
+        Index("ix_sent_alerts_telegram_id_figi_sent_at", "telegram_id", "figi", "sent_at"),
+        {
+            "postgresql_partition_by": "RANGE (sent_at)",
+            "info": {
+                "partition_column": "sent_at",
+                "dropped_indexes": ["ix_sent_alerts_telegram_id"],
+            },
+        },
+    )
 
+    # Ключ секционированной таблицы должен включать колонку секционирования
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    telegram_id: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
+    telegram_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     figi: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
 
     # Тип алерта: 'drop_warning', 'drop_critical', 'rise_warning', 'rise_critical'
     alert_type: Mapped[str] = mapped_column(String(32), nullable=False)
 
     # Время отправки
-    sent_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    sent_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True, server_default=func.now()
+    )
 
     # Количество отправленных алертов за день
     daily_count: Mapped[int] = mapped_column(Integer, default=1)
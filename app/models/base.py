@@ -20,11 +20,28 @@ class Base(DeclarativeBase):
 
 # Импортируем все модели здесь, чтобы SQLAlchemy их видел при создании таблиц
 try:
-    from models.alerts import BondPriceHistory, SentAlert, UserAlertSettings
+    from models.alerts import (
+        BondLatestPrice,
+        BondPriceHistory,
+        SentAlert,
+        UserAlertSettings,
+        UserBondHolding,
+    )
+    from models.instruments import BondCatalogEntry, BondEventsCacheEntry
     from models.user import User
 
     # Добавляем все модели в список для явного экспорта
-    __all__ = ["Base", "User", "UserAlertSettings", "BondPriceHistory", "SentAlert"]
+    __all__ = [
+        "Base",
+        "User",
+        "UserAlertSettings",
+        "BondPriceHistory",
+        "BondLatestPrice",
+        "UserBondHolding",
+        "SentAlert",
+        "BondCatalogEntry",
+        "BondEventsCacheEntry",
+    ]
 except ImportError as e:
     # Если модель не может быть импортирована, логируем предупреждение
     import logging
@@ -0,0 +1,58 @@
+"""Модели справочника инструментов T-Invest."""
+
+from datetime import datetime
+
+from models.base import Base
+from sqlalchemy import JSON, BigInteger, DateTime, Integer, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+
+class BondCatalogEntry(Base):
+    """Снимок справочника облигаций для быстрого старта после перезапуска."""
+
+    __tablename__ = "bond_catalog"
+
+    figi: Mapped[str] = mapped_column(String(64), primary_key=True)
+    ticker: Mapped[str] = mapped_column(String(32), nullable=False, default="")
+    name: Mapped[str] = mapped_column(String(255), nullable=False, default="")
+
+    # Номинал в формате MoneyValue
+    nominal_units: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    nominal_nano: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    currency: Mapped[str] = mapped_column(String(16), nullable=False, default="")
+
+    maturity_date: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    coupon_quantity_per_year: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    # Время загрузки снимка
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self) -> str:
+        """Представление модели."""
+        return f"<BondCatalogEntry(figi={self.figi}, ticker={self.ticker})>"
+
+
+class BondEventsCacheEntry(Base):
+    """Кэш событий по облигации (GetBondEvents)."""
+
+    __tablename__ = "bond_events_cache"
+
+    figi: Mapped[str] = mapped_column(String(64), primary_key=True)
+    event_type: Mapped[str] = mapped_column(String(32), primary_key=True)
+
+    # Горизонт запроса в днях от момента загрузки
+    window_days: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    # События в формате ответа API
+    events: Mapped[list] = mapped_column(JSON, nullable=False, default=list)
+
+    fetched_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+    # Последнее чтение записи пользователями (ночное обновление его не меняет)
+    accessed_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+    def __repr__(self) -> str:
+        """Представление модели."""
+        return f"<BondEventsCacheEntry(figi={self.figi}, type={self.event_type})>"
@@ -1,21 +1,37 @@
 """Сервис уведомлений об аномальных изменениях цен облигаций."""
 
 import logging
+from datetime import UTC, datetime, timedelta
 
 from aiogram import Bot
+from core.config import config
+from core.database import unit_of_work
+from invest.alert_state import alert_state
+from invest.anomaly_engine import detect_anomalies_batch
+from invest.bond_catalog import bond_catalog
 from invest.price_monitor import (
     PriceAnomaly,
-    detect_anomalies,
-    get_portfolio_bond_prices,
-    should_send_alert,
+    filter_alerts_to_send,
+    get_market_bond_prices,
+    get_portfolio_bond_holdings,
+    price_statistics,
 )
-from storage import AlertStorage
+from storage import AlertStorage, BotUserStorage
+from utils.telegram_sender import SendResult, telegram_sender
+from utils.worker_pool import WorkerPool
 
 logger = logging.getLogger(__name__)
 
 # Максимум аномалий в одном сообщении перед агрегацией
 MAX_ANOMALIES_BEFORE_AGGREGATE = 3
 
+price_monitor_pool = WorkerPool(
+    "Проверка цен",
+    concurrency=config.price_monitor_concurrency,
+    timeout=config.price_monitor_user_timeout_seconds,
+    per_key_limit=config.price_monitor_per_token_concurrency,
+)
+
 
 class PriceAlertService:
     """Сервис для мониторинга цен и отправки уведомлений."""
@@ -24,75 +40,113 @@ class PriceAlertService:
     async def check_price_anomalies(bot: Bot) -> None:
         """Основная задача scheduler - проверка цен для всех пользователей.
 
+        Состав портфелей обновляется из API раз в holdings_refresh_minutes,
+        а рыночные цены всех облигаций из портфелей запрашиваются каждый
+        прогон одним пакетом и общие для всех пользователей.
+
         Args:
             bot: Экземпляр бота для отправки сообщений
 
         """
         logger.info("Запуск проверки аномалий цен облигаций")
 
-        # Получаем всех пользователей с включенными уведомлениями
-        users = await AlertStorage.get_all_users_with_alerts_enabled()
-
-        if not users:
-            logger.info("Нет пользователей с включенными уведомлениями")
-            return
+        # Пользователи, токены и портфели - в одной сессии; запросы к API
+        # выполняются уже без занятого соединения (токены и настройки
+        # попадают в кэш)
+        async with unit_of_work() as session:
+            users = await AlertStorage.get_settings_with_alerts_enabled(session)
+            if not users:
+                logger.info("Нет пользователей с включенными уведомлениями")
+                return
+            user_ids = [user.telegram_id for user in users]
+            tokens = await BotUserStorage.get_tokens(user_ids, session)
+            stored_holdings = await AlertStorage.get_user_holdings(user_ids, session)
 
         logger.info(f"Проверка цен для {len(users)} пользователей")
 
-        for telegram_id in users:
-            try:
-                await PriceAlertService._check_user_portfolio(bot, telegram_id)
-            except Exception as e:
-                logger.error(f"Ошибка при проверке портфеля пользователя {telegram_id}: {e}")
-
-        # Периодическая очистка старых данных
-        await AlertStorage.cleanup_old_prices(days_to_keep=7)
-        await AlertStorage.cleanup_old_alerts(days_to_keep=7)
-
-        logger.info("Проверка аномалий цен завершена")
-
-    @staticmethod
-    async def _check_user_portfolio(bot: Bot, telegram_id: int) -> None:
-        """Проверяет портфель одного пользователя на аномалии.
-
-        Args:
-            bot: Экземпляр бота
-            telegram_id: ID пользователя в Telegram
-
-        """
-        # Получаем настройки пользователя
-        settings = await AlertStorage.get_user_settings(telegram_id)
-        if not settings or not settings.alerts_enabled:
-            return
+        # Сохранённые портфели пользователей, удаливших токен, не проверяются
+        holdings: dict[int, dict[str, str]] = {
+            telegram_id: {holding.figi: holding.account_name for holding in user_holdings}
+            for telegram_id, user_holdings in stored_holdings.items()
+            if tokens.get(telegram_id)
+        }
+
+        # Портфели с устаревшим составом загружаются конкурентно; одновременно
+        # не больше price_monitor_per_token_concurrency загрузок на один токен
+        refresh_before = datetime.now(UTC) - timedelta(minutes=config.holdings_refresh_minutes)
+        stale_users = [
+            user
+            for user in users
+            if tokens.get(user.telegram_id)
+            and (
+                user.telegram_id not in stored_holdings
+                or min(h.updated_at for h in stored_holdings[user.telegram_id]) < refresh_before
+            )
+        ]
+        run = await price_monitor_pool.run(
+            stale_users,
+            lambda settings: get_portfolio_bond_holdings(settings.telegram_id),
+            key=lambda settings: tokens[settings.telegram_id],
+        )
+        refreshed = {settings.telegram_id: user_holdings for settings, user_holdings in run.results}
+        holdings.update(refreshed)
+
+        # Обновлённые портфели сохраняются сразу, независимо от исхода запроса
+        # цен: иначе следующий прогон загрузил бы их из API заново
+        if refreshed:
+            await AlertStorage.replace_user_holdings(
+                {
+                    telegram_id: [
+                        {"figi": figi, "account_name": account_name}
+                        for figi, account_name in user_holdings.items()
+                    ]
+                    for telegram_id, user_holdings in refreshed.items()
+                }
+            )
 
-        # Получаем текущие цены
-        current_prices = await get_portfolio_bond_prices(telegram_id)
-        if not current_prices:
-            logger.debug(f"Нет облигаций в портфеле пользователя {telegram_id}")
+        # Цены всех облигаций из портфелей - одним пакетом запросов. Предыдущие
+        # цены читаются до любых записей (через FastQueries); текущие пишутся в
+        # конце прогона - одна на figi, сколько бы пользователей её ни держали
+        figis = sorted({figi for user_holdings in holdings.values() for figi in user_holdings})
+        previous_prices = await AlertStorage.get_latest_prices(figis)
+        try:
+            prices = await get_market_bond_prices(figis)
+        except Exception as e:
+            logger.error(f"Ошибка при получении рыночных цен облигаций: {e}")
             return
 
-        # Получаем предыдущие цены
-        previous_prices = await AlertStorage.get_latest_prices(telegram_id)
-
-        # Если есть предыдущие цены - ищем аномалии
-        if previous_prices:
-            anomalies = detect_anomalies(current_prices, previous_prices, settings)
-
-            if anomalies:
+        # Аномалии всех пользователей - одним расчётом; окна цен для
+        # детекторов EWMA и z-score пополняются уже после сравнения
+        anomalies_by_user = detect_anomalies_batch(
+            holdings,
+            {user.telegram_id: user for user in users},
+            prices,
+            {figi: price.price_percent for figi, price in previous_prices.items()},
+            bond_catalog.get_all(),
+            baselines=price_statistics.baselines(prices),
+        )
+        price_statistics.update(prices)
+        for telegram_id, anomalies in anomalies_by_user.items():
+            try:
                 await PriceAlertService._send_alerts(bot, telegram_id, anomalies)
+            except Exception as e:
+                logger.error(f"Ошибка при отправке алертов пользователю {telegram_id}: {e}")
+
+        market_prices = []
+        for figi, price in prices.items():
+            bond = bond_catalog.get(figi)
+            if bond is not None:
+                market_prices.append(
+                    {"figi": figi, "ticker": bond.ticker, "name": bond.name, "price_percent": price}
+                )
+        await AlertStorage.save_market_prices(market_prices)
 
-        # Сохраняем текущие цены
-        price_data = [
-            {
-                "figi": p.figi,
-                "ticker": p.ticker,
-                "name": p.name,
-                "price_percent": p.price_percent,
-                "account_name": p.account_name,
-            }
-            for p in current_prices
-        ]
-        await AlertStorage.save_price_snapshot(telegram_id, price_data)
+        logger.info(
+            f"Проверка аномалий цен завершена: {len(holdings)} пользователей, "
+            f"{len(prices)} облигаций, алерты у {len(anomalies_by_user)}; портфели обновлены у {len(refreshed)} из "
+            f"{len(stale_users)} за {run.duration:.1f} с ({run.rate:.1f}/с), "
+            f"ошибок {len(run.failed)}, таймаутов {len(run.timed_out)}"
+        )
 
     @staticmethod
     async def _send_alerts(
@@ -107,10 +161,7 @@ class PriceAlertService:
 
         """
         # Фильтруем аномалии по anti-spam правилам
-        alerts_to_send: list[PriceAnomaly] = []
-        for anomaly in anomalies:
-            if await should_send_alert(telegram_id, anomaly):
-                alerts_to_send.append(anomaly)
+        alerts_to_send = await filter_alerts_to_send(telegram_id, anomalies)
 
         if not alerts_to_send:
             return
@@ -136,21 +187,18 @@ class PriceAlertService:
         """
         message = PriceAlertService._format_alert_message(anomaly)
 
-        try:
-            await bot.send_message(telegram_id, message, parse_mode="HTML")
-
-            # Записываем отправленный алерт
-            await AlertStorage.record_sent_alert(
-                telegram_id, anomaly.figi, anomaly.alert_type.value
-            )
+        result = await telegram_sender.send(bot, telegram_id, message, parse_mode="HTML")
+        if result is not SendResult.DELIVERED:
+            logger.error(f"Не удалось отправить алерт пользователю {telegram_id}")
+            return
 
-            logger.info(
-                f"Отправлен алерт пользователю {telegram_id}: "
-                f"{anomaly.ticker} {anomaly.alert_type.value}"
-            )
+        # Учитываем отправленный алерт (в sent_alerts запишется при flush)
+        alert_state.record(telegram_id, [(anomaly.figi, anomaly.alert_type.value)])
 
-        except Exception as e:
-            logger.error(f"Ошибка при отправке алерта пользователю {telegram_id}: {e}")
+        logger.info(
+            f"Отправлен алерт пользователю {telegram_id}: "
+            f"{anomaly.ticker} {anomaly.alert_type.value}"
+        )
 
     @staticmethod
     async def _send_aggregated_alert(
@@ -194,22 +242,18 @@ class PriceAlertService:
 
         message = "\n".join(lines)
 
-        try:
-            await bot.send_message(telegram_id, message, parse_mode="HTML")
-
-            # Записываем все алерты
-            for anomaly in anomalies:
-                await AlertStorage.record_sent_alert(
-                    telegram_id, anomaly.figi, anomaly.alert_type.value
-                )
+        result = await telegram_sender.send(bot, telegram_id, message, parse_mode="HTML")
+        if result is not SendResult.DELIVERED:
+            logger.error(f"Не удалось отправить сводный алерт пользователю {telegram_id}")
+            return
 
-            logger.info(
-                f"Отправлен сводный алерт пользователю {telegram_id}: "
-                f"{len(anomalies)} аномалий"
-            )
+        # Учитываем все алерты (в sent_alerts запишутся при flush)
+        alert_state.record(telegram_id, [(a.figi, a.alert_type.value) for a in anomalies])
 
-        except Exception as e:
-            logger.error(f"Ошибка при отправке сводного алерта пользователю {telegram_id}: {e}")
+        logger.info(
+            f"Отправлен сводный алерт пользователю {telegram_id}: "
+            f"{len(anomalies)} аномалий"
+        )
 
     @staticmethod
     def _format_alert_message(anomaly: PriceAnomaly) -> str:
@@ -1,16 +1,28 @@
 """Сервис для рассылки отчётов пользователям."""
 
+import asyncio
 import logging
 
 from aiogram import Bot
-from aiogram.types import ChatIdUnion
+from core.config import config
 from core.enums import ReportType
 from invest.invest import get_coupon_payment
 from storage import BotUserStorage
 from utils.datetime_utils import DateTimeHelper
+from utils.telegram_sender import SendResult, telegram_sender
+from utils.worker_pool import WorkerPool
 
 logger = logging.getLogger(__name__)
 
+# Расчёт отчётов: запросы к API ограничиваются rate limiter'ом клиента,
+# пул не даёт одному токену занять все места
+report_pool = WorkerPool(
+    "Отчёты",
+    concurrency=config.report_concurrency,
+    timeout=config.report_user_timeout_seconds,
+    per_key_limit=config.report_per_token_concurrency,
+)
+
 
 class ReportService:
     """Сервис для рассылки отчётов."""
@@ -19,45 +31,78 @@ class ReportService:
     async def send_report(bot: Bot, report_type: ReportType) -> None:
         """Рассылка отчёта всем пользователям.
 
+        Отчёты рассчитываются конкурентно в report_pool, готовые отчёты сразу
+        попадают в очередь отправки, которую разбирают отправители через
+        telegram_sender. Пользователи без токена не получают отчёт.
+        Деактивируются только пользователи, чат с которыми недоступен
+        (бот заблокирован, чат не найден).
+
         Args:
             bot: Экземпляр бота
             report_type: Тип отчёта (дневной/недельный)
 
         """
-        user_count = await BotUserStorage.get_user_count()
-        if user_count == 0:
-            logger.info("Нет пользователей для рассылки")
+        if report_type.value == "daily":
+            start_datetime = DateTimeHelper.get_today_start()
+        elif report_type.value == "weekly":
+            start_datetime = DateTimeHelper.get_week_start()
+        else:
+            logger.error(f"Неизвестный тип отчета: {report_type.value}")
             return
 
-        try:
-            if report_type.value == "daily":
-                start_datetime = DateTimeHelper.get_today_start()
-            elif report_type.value == "weekly":
-                start_datetime = DateTimeHelper.get_week_start()
-            else:
-                logger.error(f"Неизвестный тип отчета: {report_type.value}")
-                return
-
-            failed_users = []
-            all_users = await BotUserStorage.get_all_active_users()
-
-            for uid in all_users:
-                try:
-                    text = await get_coupon_payment(user_id=uid, start_datetime=start_datetime)
-                    await bot.send_message(uid, text, parse_mode="HTML")
-                except Exception as e:
-                    logger.error(f"Ошибка при отправке пользователю {uid}: {e}")
-                    failed_users.append(uid)
+        # Активные пользователи с токенами - одним запросом до начала рассылки
+        tokens = await BotUserStorage.get_active_users_with_tokens()
+        if not tokens:
+            logger.info("Нет пользователей для рассылки")
+            return
 
-            # Деактивируем пользователей, которым не удалось отправить сообщение
-            for uid in failed_users:
-                await BotUserStorage.deactivate_user(uid)
+        outbox: asyncio.Queue[tuple[int, str]] = asyncio.Queue()
+        send_results: dict[SendResult, list[int]] = {result: [] for result in SendResult}
 
-            successful_sends = user_count - len(failed_users)
-            logger.info(f"Отчет '{report_type.value}' отправлен {successful_sends} пользователям")
+        async def compute(telegram_id: int) -> None:
+            text = await get_coupon_payment(
+                user_id=telegram_id, start_datetime=start_datetime, token=tokens[telegram_id]
+            )
+            await outbox.put((telegram_id, text))
 
-            if failed_users:
-                logger.warning(f"Не удалось отправить {len(failed_users)} пользователям")
+        async def deliver() -> None:
+            while True:
+                telegram_id, text = await outbox.get()
+                try:
+                    result = await telegram_sender.send(bot, telegram_id, text, parse_mode="HTML")
+                    send_results[result].append(telegram_id)
+                finally:
+                    outbox.task_done()
 
+        senders = [asyncio.create_task(deliver()) for _ in range(config.report_send_concurrency)]
+        try:
+            run = await report_pool.run(tokens, compute, key=tokens.get)
+            await outbox.join()
         except Exception as e:
             logger.error(f"Ошибка при рассылке отчета: {e}")
+            return
+        finally:
+            for sender in senders:
+                sender.cancel()
+            await asyncio.gather(*senders, return_exceptions=True)
+
+        # Деактивируем пользователей, заблокировавших бота или удаливших чат
+        undeliverable = send_results[SendResult.UNDELIVERABLE]
+        await BotUserStorage.deactivate_users(undeliverable)
+
+        logger.info(
+            f"Отчет '{report_type.value}' отправлен "
+            f"{len(send_results[SendResult.DELIVERED])} пользователям за {run.duration:.1f} с"
+        )
+        if undeliverable:
+            logger.warning(
+                f"Чат недоступен у {len(undeliverable)} пользователей, они деактивированы"
+            )
+        if send_results[SendResult.FAILED]:
+            logger.warning(
+                f"Не удалось отправить {len(send_results[SendResult.FAILED])} пользователям"
+            )
+        if run.failed or run.timed_out:
+            logger.warning(
+                f"Не удалось рассчитать отчет {len(run.failed) + len(run.timed_out)} пользователям"
+            )
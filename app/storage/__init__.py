@@ -2,5 +2,6 @@
 
 from .alert_storage import AlertStorage
 from .bot_user_storage import BotUserStorage
+from .instrument_storage import InstrumentStorage
 
-__all__ = ["AlertStorage", "BotUserStorage"]
+__all__ = ["AlertStorage", "BotUserStorage", "InstrumentStorage"]
@@ -0,0 +1,39 @@
+"""Отложенная запись времени последней активности пользователей."""
+
+import logging
+from datetime import UTC, datetime
+
+from .bot_user_storage import BotUserStorage
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityTracker:
+    """Буфер last_activity в памяти с периодической записью одним запросом.
+
+    Обработчики сообщений только отмечают активность в памяти; в bot_users
+    время записывается при flush. Для каждого пользователя хранится лишь
+    последнее время, поэтому размер буфера ограничен числом активных
+    пользователей за период между flush.
+    """
+
+    def __init__(self) -> None:
+        """Инициализирует пустой буфер."""
+        self._pending: dict[int, datetime] = {}
+
+    def touch(self, telegram_id: int) -> None:
+        """Отмечает активность пользователя в текущий момент."""
+        self._pending[telegram_id] = datetime.now(UTC)
+
+    async def flush(self) -> None:
+        """Записывает накопленное время активности в bot_users."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        if not await BotUserStorage.update_last_activity_bulk(pending):
+            # Повторим при следующем flush, не затирая более свежие отметки
+            for telegram_id, last_activity in pending.items():
+                self._pending.setdefault(telegram_id, last_activity)
+
+
+activity_tracker = ActivityTracker()
@@ -1,11 +1,22 @@
 """Модуль для управления данными уведомлений о ценах."""
 
 import logging
-from datetime import datetime, timedelta
-
-from core.database import get_session
-from models.alerts import BondPriceHistory, SentAlert, UserAlertSettings
-from sqlalchemy import delete, func, select, update
+from datetime import UTC, datetime, timedelta
+
+from core.database import get_session, session_scope
+from models.alerts import (
+    BondLatestPrice,
+    BondPriceHistory,
+    SentAlert,
+    UserAlertSettings,
+    UserBondHolding,
+)
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .cache import MISSING, settings_cache
+from .fast_queries import FastQueries
 
 logger = logging.getLogger(__name__)
 
@@ -20,22 +31,47 @@ class AlertStorage:
     # === Настройки пользователя ===
 
     @classmethod
-    async def get_user_settings(cls, telegram_id: int) -> UserAlertSettings | None:
-        """Получает настройки уведомлений пользователя."""
-        async for session in get_session():
-            try:
-                result = await session.execute(
-                    select(UserAlertSettings).where(UserAlertSettings.telegram_id == telegram_id)
-                )
-                return result.scalar_one_or_none()
-            except Exception as e:
-                logger.error(f"Ошибка при получении настроек пользователя {telegram_id}: {e}")
-                return None
-        return None
+    async def get_user_settings(
+        cls, telegram_id: int, session: AsyncSession | None = None
+    ) -> UserAlertSettings | None:
+        """Получает настройки уведомлений пользователя.
+
+        Найденные настройки кэшируются в памяти, кэш сбрасывается в
+        update_user_settings. Возвращаемый объект общий - не изменять.
+        Без сессии запрос выполняется через FastQueries.
+        """
+        cached = settings_cache.get(telegram_id)
+        if cached is not MISSING:
+            return cached
+
+        try:
+            if session is None:
+                settings = await FastQueries.get_user_settings(telegram_id)
+            else:
+                async with session_scope(session) as session:
+                    result = await session.execute(
+                        select(UserAlertSettings).where(
+                            UserAlertSettings.telegram_id == telegram_id
+                        )
+                    )
+                    settings = result.scalar_one_or_none()
+            if settings:
+                settings_cache.set(telegram_id, settings)
+            return settings
+        except Exception as e:
+            logger.error(f"Ошибка при получении настроек пользователя {telegram_id}: {e}")
+            return None
 
     @classmethod
     async def get_or_create_user_settings(cls, telegram_id: int) -> UserAlertSettings:
-        """Получает или создаёт настройки уведомлений пользователя."""
+        """Получает или создаёт настройки уведомлений пользователя.
+
+        Возвращаемый объект общий (кэш) - не изменять.
+        """
+        cached = settings_cache.get(telegram_id)
+        if cached is not MISSING:
+            return cached
+
         async for session in get_session():
             try:
                 result = await session.execute(
@@ -44,6 +80,7 @@ class AlertStorage:
                 settings = result.scalar_one_or_none()
 
                 if settings:
+                    settings_cache.set(telegram_id, settings)
                     return settings
 
                 # Создаём новые настройки с дефолтными значениями
@@ -51,6 +88,7 @@ class AlertStorage:
                 session.add(settings)
                 await session.commit()
                 await session.refresh(settings)
+                settings_cache.set(telegram_id, settings)
 
                 logger.info(f"Созданы настройки уведомлений для пользователя {telegram_id}")
                 return settings
@@ -75,6 +113,7 @@ class AlertStorage:
                     .values(**kwargs)
                 )
                 await session.commit()
+                settings_cache.invalidate(telegram_id)
 
                 affected = getattr(result, "rowcount", 0)
                 if affected > 0:
@@ -97,214 +136,355 @@ class AlertStorage:
         return new_state
 
     @classmethod
-    async def get_all_users_with_alerts_enabled(cls) -> list[int]:
-        """Возвращает список telegram_id пользователей с включенными уведомлениями."""
-        async for session in get_session():
-            try:
+    async def get_settings_with_alerts_enabled(
+        cls, session: AsyncSession | None = None
+    ) -> list[UserAlertSettings]:
+        """Возвращает настройки пользователей с включенными уведомлениями.
+
+        Настройки попадают в кэш, поэтому последующие get_user_settings для
+        этих пользователей не обращаются к БД.
+        """
+        try:
+            async with session_scope(session) as session:
                 result = await session.execute(
-                    select(UserAlertSettings.telegram_id).where(
+                    select(UserAlertSettings).where(
                         UserAlertSettings.alerts_enabled == True  # noqa: E712
                     )
                 )
-                return list(result.scalars().all())
-            except Exception as e:
-                logger.error(f"Ошибка при получении пользователей с уведомлениями: {e}")
-                return []
-        return []
+                settings = list(result.scalars().all())
+            for user_settings in settings:
+                settings_cache.set(user_settings.telegram_id, user_settings)
+            return settings
+        except Exception as e:
+            logger.error(f"Ошибка при получении пользователей с уведомлениями: {e}")
+            return []
 
     # === История цен ===
 
     @classmethod
-    async def get_latest_prices(cls, telegram_id: int) -> list[BondPriceHistory]:
-        """Получает последние сохранённые цены облигаций пользователя."""
-        async for session in get_session():
-            try:
-                # Получаем последнюю запись для каждой облигации
-                subquery = (
+    async def get_latest_prices(
+        cls, figis: list[str] | None = None, session: AsyncSession | None = None
+    ) -> dict[str, BondLatestPrice]:
+        """Получает последние сохранённые рыночные цены облигаций.
+
+        Args:
+            figis: FIGI облигаций (None - все сохранённые)
+            session: Сессия unit_of_work (None - запрос через FastQueries)
+
+        Returns:
+            Цены по figi
+
+        """
+        try:
+            if session is None:
+                return await FastQueries.get_latest_prices(figis)
+            async with session_scope(session) as session:
+                query = select(BondLatestPrice)
+                if figis is not None:
+                    query = query.where(BondLatestPrice.figi.in_(figis))
+                result = await session.execute(query)
+                return {price.figi: price for price in result.scalars()}
+
+        except Exception as e:
+            logger.error(f"Ошибка при получении последних цен облигаций: {e}")
+            return {}
+
+    @classmethod
+    async def get_price_history(
+        cls, since: datetime, limit_per_figi: int, session: AsyncSession | None = None
+    ) -> list[tuple[str, float, datetime]]:
+        """Возвращает последние рыночные цены каждой облигации начиная с since.
+
+        Args:
+            since: Начало периода
+            limit_per_figi: Максимум последних цен одной облигации
+            session: Сессия unit_of_work (None - отдельная сессия)
+
+        Returns:
+            Кортежи (figi, цена, время) от старых к новым
+
+        """
+        try:
+            async with session_scope(session) as session:
+                recent = (
                     select(
                         BondPriceHistory.figi,
-                        func.max(BondPriceHistory.recorded_at).label("max_recorded")
+                        BondPriceHistory.price_percent,
+                        BondPriceHistory.recorded_at,
+                        func.row_number()
+                        .over(
+                            partition_by=BondPriceHistory.figi,
+                            order_by=BondPriceHistory.recorded_at.desc(),
+                        )
+                        .label("position"),
                     )
-                    .where(BondPriceHistory.telegram_id == telegram_id)
-                    .group_by(BondPriceHistory.figi)
+                    .where(BondPriceHistory.recorded_at >= since)
                     .subquery()
                 )
-
                 result = await session.execute(
-                    select(BondPriceHistory)
-                    .join(
-                        subquery,
-                        (BondPriceHistory.figi == subquery.c.figi)
-                        & (BondPriceHistory.recorded_at == subquery.c.max_recorded)
-                    )
-                    .where(BondPriceHistory.telegram_id == telegram_id)
+                    select(recent.c.figi, recent.c.price_percent, recent.c.recorded_at)
+                    .where(recent.c.position <= limit_per_figi)
+                    .order_by(recent.c.recorded_at)
                 )
+                return [tuple(row) for row in result.all()]
 
-                return list(result.scalars().all())
-
-            except Exception as e:
-                logger.error(f"Ошибка при получении цен пользователя {telegram_id}: {e}")
-                return []
-        return []
+        except Exception as e:
+            logger.error(f"Ошибка при получении истории цен облигаций: {e}")
+            return []
 
     @classmethod
-    async def save_price_snapshot(
-        cls, telegram_id: int, prices: list[dict]
-    ) -> bool:
-        """Сохраняет текущие цены облигаций.
+    async def backfill_latest_prices(cls) -> int:
+        """Заполняет bond_latest_price из истории цен, если таблица пуста.
 
-        Args:
-            telegram_id: ID пользователя
-            prices: Список словарей с ключами: figi, ticker, name, price_percent, account_name
+        Нужно после создания или пересоздания таблицы, чтобы первый прогон
+        мониторинга сравнивал цены с историей, а не пропускал все облигации.
 
         Returns:
-            True если успешно, False иначе
+            Количество добавленных записей
 
         """
         async for session in get_session():
             try:
-                for price_data in prices:
-                    record = BondPriceHistory(
-                        telegram_id=telegram_id,
-                        figi=price_data["figi"],
-                        ticker=price_data["ticker"],
-                        name=price_data["name"],
-                        price_percent=price_data["price_percent"],
-                        account_name=price_data.get("account_name"),
-                    )
-                    session.add(record)
-
-                await session.commit()
-                logger.debug(f"Сохранено {len(prices)} цен для пользователя {telegram_id}")
-                return True
+                existing = await session.execute(select(BondLatestPrice.figi).limit(1))
+                if existing.first() is not None:
+                    return 0
 
-            except Exception as e:
-                await session.rollback()
-                logger.error(f"Ошибка при сохранении цен пользователя {telegram_id}: {e}")
-                return False
-        return False
-
-    @classmethod
-    async def cleanup_old_prices(cls, days_to_keep: int = 7) -> int:
-        """Удаляет старые записи цен."""
-        async for session in get_session():
-            try:
-                cutoff_date = datetime.utcnow() - timedelta(days=days_to_keep)
+                latest = (
+                    select(
+                        BondPriceHistory.figi,
+                        BondPriceHistory.ticker,
+                        BondPriceHistory.name,
+                        BondPriceHistory.price_percent,
+                        BondPriceHistory.recorded_at,
+                    )
+                    .distinct(BondPriceHistory.figi)
+                    .order_by(
+                        BondPriceHistory.figi,
+                        BondPriceHistory.recorded_at.desc(),
+                        BondPriceHistory.id.desc(),
+                    )
+                )
                 result = await session.execute(
-                    delete(BondPriceHistory).where(BondPriceHistory.recorded_at < cutoff_date)
+                    insert(BondLatestPrice).from_select(
+                        ["figi", "ticker", "name", "price_percent", "recorded_at"],
+                        latest,
+                    )
                 )
                 await session.commit()
-                deleted = getattr(result, "rowcount", 0)
-                logger.info(f"Удалено {deleted} старых записей цен")
-                return deleted
+                inserted = getattr(result, "rowcount", 0)
+                if inserted:
+                    logger.info(f"Последние цены заполнены из истории: {inserted} записей")
+                return inserted
+
             except Exception as e:
                 await session.rollback()
-                logger.error(f"Ошибка при очистке старых цен: {e}")
+                logger.error(f"Ошибка при заполнении последних цен: {e}")
                 return 0
         return 0
 
-    # === Anti-spam механизмы ===
-
     @classmethod
-    async def record_sent_alert(cls, telegram_id: int, figi: str, alert_type: str) -> bool:
-        """Записывает отправленный алерт."""
-        async for session in get_session():
-            try:
-                record = SentAlert(
-                    telegram_id=telegram_id,
-                    figi=figi,
-                    alert_type=alert_type,
-                )
-                session.add(record)
-                await session.commit()
-                return True
-            except Exception as e:
-                await session.rollback()
-                logger.error(f"Ошибка при записи алерта: {e}")
-                return False
-        return False
+    async def save_market_prices(
+        cls, prices: list[dict], session: AsyncSession | None = None
+    ) -> bool:
+        """Сохраняет рыночные цены облигаций: одна строка истории на figi.
 
-    @classmethod
-    async def can_send_alert(cls, telegram_id: int, figi: str) -> bool:
-        """Проверяет, можно ли отправить алерт (cooldown 4 часа)."""
-        async for session in get_session():
-            try:
-                cooldown_time = datetime.utcnow() - timedelta(hours=ALERT_COOLDOWN_HOURS)
-                result = await session.execute(
-                    select(SentAlert)
-                    .where(
-                        SentAlert.telegram_id == telegram_id,
-                        SentAlert.figi == figi,
-                        SentAlert.sent_at > cooldown_time,
-                    )
-                    .limit(1)
-                )
-                recent_alert = result.scalar_one_or_none()
-                return recent_alert is None
-            except Exception as e:
-                logger.error(f"Ошибка при проверке cooldown: {e}")
-                return True  # В случае ошибки разрешаем отправку
-        return True
+        Строки передаются в один INSERT через executemany (без ORM объектов),
+        драйвер отправляет их пачками многострочных VALUES. В той же транзакции
+        обновляется таблица последних цен bond_latest_price.
+
+        Args:
+            prices: Список словарей с ключами figi, ticker, name, price_percent
+            session: Сессия unit_of_work (None - отдельная сессия)
+
+        Returns:
+            True если успешно, False иначе
+
+        """
+        # Одна цена на figi: ON CONFLICT не обновляет строку дважды за запрос
+        rows = list(
+            {
+                price_data["figi"]: {
+                    "figi": price_data["figi"],
+                    "ticker": price_data["ticker"],
+                    "name": price_data["name"],
+                    "price_percent": price_data["price_percent"],
+                }
+                for price_data in prices
+            }.values()
+        )
+        if not rows:
+            return True
+
+        upsert = pg_insert(BondLatestPrice)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[BondLatestPrice.figi],
+            set_={
+                "ticker": upsert.excluded.ticker,
+                "name": upsert.excluded.name,
+                "price_percent": upsert.excluded.price_percent,
+                "recorded_at": func.now(),
+            },
+        )
+
+        try:
+            async with session_scope(session) as session:
+                await session.execute(insert(BondPriceHistory), rows)
+                await session.execute(upsert, rows)
+            logger.debug(f"Сохранено {len(rows)} рыночных цен облигаций")
+            return True
+
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении рыночных цен облигаций: {e}")
+            return False
 
     @classmethod
-    async def get_daily_alert_count(cls, telegram_id: int) -> int:
-        """Возвращает количество алертов за сегодня."""
-        async for session in get_session():
-            try:
-                today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    async def get_user_holdings(
+        cls, telegram_ids: list[int], session: AsyncSession | None = None
+    ) -> dict[int, list[UserBondHolding]]:
+        """Получает сохранённые облигации в портфелях пользователей.
+
+        Args:
+            telegram_ids: ID пользователей
+            session: Сессия unit_of_work (None - отдельная сессия)
+
+        Returns:
+            Облигации по telegram_id (пользователи без облигаций отсутствуют)
+
+        """
+        try:
+            async with session_scope(session) as session:
                 result = await session.execute(
-                    select(func.count(SentAlert.id)).where(
-                        SentAlert.telegram_id == telegram_id,
-                        SentAlert.sent_at >= today_start,
-                    )
+                    select(UserBondHolding).where(UserBondHolding.telegram_id.in_(telegram_ids))
                 )
-                return result.scalar() or 0
-            except Exception as e:
-                logger.error(f"Ошибка при подсчёте дневных алертов: {e}")
-                return 0
-        return 0
+                holdings: dict[int, list[UserBondHolding]] = {}
+                for holding in result.scalars():
+                    holdings.setdefault(holding.telegram_id, []).append(holding)
+                return holdings
 
-    @classmethod
-    async def can_send_more_alerts_today(cls, telegram_id: int) -> bool:
-        """Проверяет, не превышен ли дневной лимит алертов."""
-        count = await cls.get_daily_alert_count(telegram_id)
-        return count < MAX_DAILY_ALERTS
+        except Exception as e:
+            logger.error(f"Ошибка при получении облигаций {len(telegram_ids)} пользователей: {e}")
+            return {}
 
     @classmethod
-    async def get_last_alert_type(cls, telegram_id: int, figi: str) -> str | None:
-        """Возвращает тип последнего алерта для данной облигации."""
-        async for session in get_session():
-            try:
-                result = await session.execute(
-                    select(SentAlert.alert_type)
-                    .where(
-                        SentAlert.telegram_id == telegram_id,
-                        SentAlert.figi == figi,
-                    )
-                    .order_by(SentAlert.sent_at.desc())
-                    .limit(1)
+    async def replace_user_holdings(
+        cls, holdings: dict[int, list[dict]], session: AsyncSession | None = None
+    ) -> bool:
+        """Заменяет облигации в портфелях пользователей одной транзакцией.
+
+        Args:
+            holdings: Облигации по пользователям: telegram_id -> список словарей
+                с ключами figi, account_name
+            session: Сессия unit_of_work (None - отдельная сессия)
+
+        Returns:
+            True если успешно, False иначе
+
+        """
+        if not holdings:
+            return True
+
+        rows = [
+            {"telegram_id": telegram_id, **holding}
+            for telegram_id, user_holdings in holdings.items()
+            for holding in user_holdings
+        ]
+
+        try:
+            async with session_scope(session) as session:
+                await session.execute(
+                    delete(UserBondHolding).where(UserBondHolding.telegram_id.in_(holdings))
                 )
-                return result.scalar_one_or_none()
-            except Exception as e:
-                logger.error(f"Ошибка при получении последнего алерта: {e}")
-                return None
-        return None
+                if rows:
+                    await session.execute(insert(UserBondHolding), rows)
+            return True
+
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении облигаций {len(holdings)} пользователей: {e}")
+            return False
 
     @classmethod
-    async def cleanup_old_alerts(cls, days_to_keep: int = 7) -> int:
-        """Удаляет старые записи алертов."""
+    async def cleanup_stale_prices(cls, days_to_keep: int = 7) -> int:
+        """Удаляет последние цены и позиции, не обновлявшиеся дольше срока хранения истории.
+
+        Сама история цен очищается удалением суточных секций
+        (DatabaseManager.maintain_partitions).
+        """
         async for session in get_session():
             try:
                 cutoff_date = datetime.utcnow() - timedelta(days=days_to_keep)
                 result = await session.execute(
-                    delete(SentAlert).where(SentAlert.sent_at < cutoff_date)
+                    delete(BondLatestPrice).where(BondLatestPrice.recorded_at < cutoff_date)
+                )
+                await session.execute(
+                    delete(UserBondHolding).where(UserBondHolding.updated_at < cutoff_date)
                 )
                 await session.commit()
                 deleted = getattr(result, "rowcount", 0)
-                logger.info(f"Удалено {deleted} старых алертов")
+                logger.info(f"Удалено {deleted} устаревших последних цен")
                 return deleted
             except Exception as e:
                 await session.rollback()
-                logger.error(f"Ошибка при очистке старых алертов: {e}")
+                logger.error(f"Ошибка при очистке последних цен: {e}")
                 return 0
         return 0
+
+    # === Anti-spam механизмы ===
+
+    @classmethod
+    async def save_sent_alerts(cls, rows: list[dict], session: AsyncSession | None = None) -> bool:
+        """Записывает отправленные алерты разных пользователей одной вставкой.
+
+        Args:
+            rows: Словари с ключами telegram_id, figi, alert_type, sent_at, daily_count
+            session: Сессия unit_of_work (None - отдельная сессия)
+
+        Returns:
+            True если успешно, False иначе
+
+        """
+        if not rows:
+            return True
+
+        try:
+            async with session_scope(session) as session:
+                await session.execute(insert(SentAlert), rows)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка при записи алертов: {e}")
+            return False
+
+    @classmethod
+    async def get_recent_alerts(
+        cls, since: datetime, telegram_id: int | None = None, session: AsyncSession | None = None
+    ) -> list[tuple[int, str, str, datetime]]:
+        """Возвращает алерты, отправленные начиная с since.
+
+        Args:
+            since: Начало периода
+            telegram_id: ID пользователя (None - все пользователи)
+            session: Сессия unit_of_work (None - отдельная сессия)
+
+        Returns:
+            Список (telegram_id, figi, alert_type, sent_at), от новых к старым
+
+        """
+        query = (
+            select(
+                SentAlert.telegram_id,
+                SentAlert.figi,
+                SentAlert.alert_type,
+                SentAlert.sent_at,
+            )
+            .where(SentAlert.sent_at >= since)
+            .order_by(SentAlert.sent_at.desc())
+        )
+        if telegram_id is not None:
+            query = query.where(SentAlert.telegram_id == telegram_id)
+
+        try:
+            async with session_scope(session) as session:
+                result = await session.execute(query)
+                return [tuple(row) for row in result.all()]
+        except Exception as e:
+            logger.error(f"Ошибка при получении отправленных алертов: {e}")
+            return []
@@ -1,12 +1,26 @@
 """Модуль для управления пользователями с использованием SQLAlchemy."""
 
 import logging
-from datetime import datetime
+from datetime import UTC, datetime
 
-from core.database import get_session
+from core.database import get_session, session_scope
 from models.user import User
-from sqlalchemy import func, select, update
+from sqlalchemy import (
+    BigInteger,
+    DateTime,
+    column,
+    func,
+    literal_column,
+    select,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.engine import CursorResult
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .cache import MISSING, token_cache
+from .fast_queries import FastQueries
 
 logger = logging.getLogger(__name__)
 
@@ -22,43 +36,48 @@ class BotUserStorage:
         first_name: str | None = None,
         last_name: str | None = None,
     ) -> bool:
-        """Добавляет пользователя в базу данных."""
-        async for session in get_session():
-            try:
-                # Проверяем, существует ли пользователь в той же сессии
-                result = await session.execute(select(User).where(User.telegram_id == telegram_id))
-                existing_user = result.scalar_one_or_none()
-
-                if existing_user:
-                    # Обновляем последнюю активность в той же сессии
-                    await session.execute(
-                        update(User)
-                        .where(User.telegram_id == telegram_id)
-                        .values(last_activity=datetime.utcnow())
-                    )
-                    await session.commit()
-                    logger.info(f"Обновлена активность пользователя: {telegram_id}")
-                    return False
-
-                # Создаем нового пользователя
-                user = User(
-                    telegram_id=telegram_id,
-                    username=username,
-                    first_name=first_name,
-                    last_name=last_name,
-                    last_activity=datetime.utcnow(),
-                )
+        """Добавляет пользователя в базу данных.
 
-                session.add(user)
-                await session.commit()
+        Выполняется одним INSERT ... ON CONFLICT: для существующего
+        пользователя обновляется только время последней активности.
 
-                logger.info(f"Добавлен новый пользователь: {telegram_id} ({username})")
-                return True
+        Returns:
+            True если пользователь новый, False если уже существовал
 
+        """
+        now = datetime.now(UTC)
+        statement = (
+            pg_insert(User)
+            .values(
+                telegram_id=telegram_id,
+                username=username,
+                first_name=first_name,
+                last_name=last_name,
+                last_activity=now,
+            )
+            .on_conflict_do_update(
+                index_elements=[User.telegram_id],
+                set_={"last_activity": now},
+            )
+            # xmax = 0 только у строки, вставленной этим запросом
+            .returning(literal_column("xmax = 0"))
+        )
+
+        async for session in get_session():
+            try:
+                result = await session.execute(statement)
+                is_new = bool(result.scalar_one())
+                await session.commit()
             except Exception as e:
                 await session.rollback()
                 logger.error(f"Ошибка при добавлении пользователя {telegram_id}: {e}")
                 raise e
+
+            if is_new:
+                logger.info(f"Добавлен новый пользователь: {telegram_id} ({username})")
+            else:
+                logger.info(f"Обновлена активность пользователя: {telegram_id}")
+            return is_new
         return False
 
     @classmethod
@@ -90,35 +109,99 @@ class BotUserStorage:
     @classmethod
     async def has_token(cls, telegram_id: int) -> bool:
         """Проверяет наличие токена пользователя."""
-        async for session in get_session():
-            try:
+        token = await cls.get_token_by_telegram_id(telegram_id)
+        has_valid_token = token is not None and token != ""
+        logger.debug(f"Проверка токена для {telegram_id}: {has_valid_token}")
+        return has_valid_token
+
+    @classmethod
+    async def get_token_by_telegram_id(
+        cls, telegram_id: int, session: AsyncSession | None = None
+    ) -> str | None:
+        """Достает токен пользователя по телеграм id.
+
+        Результат кэшируется в памяти, кэш сбрасывается в add_token и remove_token.
+        Без сессии запрос выполняется через FastQueries.
+        """
+        cached = token_cache.get(telegram_id)
+        if cached is not MISSING:
+            return cached
+
+        try:
+            if session is None:
+                token = await FastQueries.get_token(telegram_id)
+            else:
+                async with session_scope(session) as session:
+                    result = await session.execute(
+                        select(User.tinvest_token).where(User.telegram_id == telegram_id)
+                    )
+                    token = result.scalar_one_or_none()
+            logger.debug(f"Токен пользователя {telegram_id}: {'найден' if token else 'не найден'}")
+            token_cache.set(telegram_id, token)
+            return token
+        except Exception as e:
+            logger.error(f"Ошибка при получении токена для пользователя {telegram_id}: {e}")
+            return None
+
+    @classmethod
+    async def get_tokens(
+        cls, telegram_ids: list[int], session: AsyncSession | None = None
+    ) -> dict[int, str | None]:
+        """Достает токены нескольких пользователей одним запросом.
+
+        Токены из кэша не запрашиваются повторно, загруженные попадают в кэш.
+
+        Args:
+            telegram_ids: ID пользователей
+            session: Сессия unit_of_work (None - отдельная сессия)
+
+        Returns:
+            Токены по telegram_id (None - токена нет)
+
+        """
+        tokens: dict[int, str | None] = {}
+        missing: list[int] = []
+        for telegram_id in telegram_ids:
+            cached = token_cache.get(telegram_id)
+            if cached is MISSING:
+                missing.append(telegram_id)
+            else:
+                tokens[telegram_id] = cached
+        if not missing:
+            return tokens
+
+        try:
+            async with session_scope(session) as session:
                 result = await session.execute(
-                    select(User.tinvest_token).where(User.telegram_id == telegram_id)
+                    select(User.telegram_id, User.tinvest_token).where(
+                        User.telegram_id.in_(missing)
+                    )
                 )
-                token = result.scalar_one_or_none()
-                has_valid_token = token is not None and token != ""
-                logger.info(f"Проверка токена для {telegram_id}: {has_valid_token}")
-                return has_valid_token
-            except Exception as e:
-                logger.error(f"Ошибка при проверке токена пользователя {telegram_id}: {e}")
-                return False
-        return False
+                loaded = dict(result.all())
+        except Exception as e:
+            logger.error(f"Ошибка при получении токенов {len(missing)} пользователей: {e}")
+            return tokens
+
+        for telegram_id in missing:
+            token = loaded.get(telegram_id)
+            token_cache.set(telegram_id, token)
+            tokens[telegram_id] = token
+        return tokens
 
     @classmethod
-    async def get_token_by_telegram_id(cls, telegram_id: int) -> str | None:
-        """Достает токен пользователя по телеграм id."""
+    async def get_any_token(cls) -> str | None:
+        """Возвращает токен недавно активного пользователя для общих запросов к API."""
         async for session in get_session():
             try:
                 result = await session.execute(
-                    select(User.tinvest_token).where(User.telegram_id == telegram_id)
-                )
-                token = result.scalar_one_or_none()
-                logger.info(
-                    f"Токен пользователя {telegram_id}: {'найден' if token else 'не найден'}"
+                    select(User.tinvest_token)
+                    .where(User.tinvest_token.is_not(None), User.tinvest_token != "", User.is_active)
+                    .order_by(User.last_activity.desc().nulls_last())
+                    .limit(1)
                 )
-                return token
+                return result.scalar_one_or_none()
             except Exception as e:
-                logger.error(f"Ошибка при получении токена для пользователя {telegram_id}: {e}")
+                logger.error(f"Ошибка при получении токена для общих запросов: {e}")
                 return None
         return None
 
@@ -131,6 +214,7 @@ class BotUserStorage:
                     update(User).where(User.telegram_id == telegram_id).values(tinvest_token=token)
                 )
                 await session.commit()
+                token_cache.invalidate(telegram_id)
                 affected = getattr(result, "rowcount", 0)
                 if affected > 0:
                     logger.info(f"Токен добавлен для пользователя {telegram_id}")
@@ -152,6 +236,7 @@ class BotUserStorage:
                     update(User).where(User.telegram_id == telegram_id).values(tinvest_token=None)
                 )
                 await session.commit()
+                token_cache.invalidate(telegram_id)
                 return True
             except Exception as e:
                 logger.error(f"Ошибка при удалении токена пользователя {telegram_id}: {e}")
@@ -160,77 +245,115 @@ class BotUserStorage:
         return False
 
     @classmethod
-    async def get_all_active_users(cls) -> list[int]:
-        """Возвращает список telegram_id всех активных пользователей."""
-        result = []
-        async for session in get_session():
-            try:
-                result = await session.execute(select(User.telegram_id).where(User.is_active))
-                return list(result.scalars().all())
-            except Exception as e:
-                logger.error(f"Ошибка при получении активных пользователей: {e}")
-                return []
-        return []
+    async def get_active_users_with_tokens(
+        cls, session: AsyncSession | None = None
+    ) -> dict[int, str]:
+        """Возвращает токены активных пользователей, у которых есть токен.
+
+        Загруженные токены попадают в кэш.
+
+        Args:
+            session: Сессия unit_of_work (None - отдельная сессия)
+
+        Returns:
+            Токены по telegram_id
+
+        """
+        try:
+            async with session_scope(session) as session:
+                result = await session.execute(
+                    select(User.telegram_id, User.tinvest_token).where(
+                        User.is_active,
+                        User.tinvest_token.is_not(None),
+                        User.tinvest_token != "",
+                    )
+                )
+                tokens = dict(result.all())
+        except Exception as e:
+            logger.error(f"Ошибка при получении активных пользователей с токенами: {e}")
+            return {}
+
+        for telegram_id, token in tokens.items():
+            token_cache.set(telegram_id, token)
+        return tokens
 
     @classmethod
-    async def get_user_count(cls) -> int:
+    async def get_user_count(cls, session: AsyncSession | None = None) -> int:
         """Возвращает количество активных пользователей."""
-        async for session in get_session():
-            try:
+        try:
+            async with session_scope(session) as session:
                 result = await session.execute(select(func.count(User.id)).where(User.is_active))
                 return result.scalar() or 0
-            except Exception as e:
-                logger.error(f"Ошибка при подсчете пользователей: {e}")
-                return 0
-        return 0
+        except Exception as e:
+            logger.error(f"Ошибка при подсчете пользователей: {e}")
+            return 0
 
     @classmethod
-    async def update_last_activity(cls, telegram_id: int) -> bool:
-        """Обновляет время последней активности пользователя."""
-        async for session in get_session():
-            try:
-                result = await session.execute(
-                    update(User)
-                    .where(User.telegram_id == telegram_id)
-                    .values(last_activity=datetime.utcnow())
-                )
-                await session.commit()
+    async def update_last_activity_bulk(
+        cls, activity: dict[int, datetime], session: AsyncSession | None = None
+    ) -> bool:
+        """Обновляет время последней активности нескольких пользователей.
 
-                affected = getattr(result, "rowcount", 0)
-                if affected > 0:
-                    logger.debug(f"Обновлена активность пользователя: {telegram_id}")
-                    return True
-                else:
-                    logger.warning(
-                        f"Пользователь {telegram_id} не найден для обновления активности"
-                    )
-                    return False
+        Выполняется одним UPDATE ... FROM (VALUES ...). Более позднее время,
+        уже записанное в БД (например, при /start), не перезаписывается.
 
-            except Exception as e:
-                await session.rollback()
-                logger.error(f"Ошибка при обновлении активности {telegram_id}: {e}")
-                return False
-        return False
+        Args:
+            activity: Время последней активности по telegram_id
+            session: Сессия unit_of_work (None - отдельная сессия)
+
+        Returns:
+            True если успешно, False иначе
+
+        """
+        if not activity:
+            return True
+
+        rows = values(
+            column("telegram_id", BigInteger),
+            column("last_activity", DateTime(timezone=True)),
+            name="activity",
+        ).data(list(activity.items()))
+        statement = (
+            update(User)
+            .where(User.telegram_id == rows.c.telegram_id)
+            .values(last_activity=func.greatest(User.last_activity, rows.c.last_activity))
+        )
+
+        try:
+            async with session_scope(session) as session:
+                await session.execute(statement)
+            logger.debug(f"Обновлена активность {len(activity)} пользователей")
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении активности {len(activity)} пользователей: {e}")
+            return False
 
     @classmethod
-    async def deactivate_user(cls, telegram_id: int) -> bool:
-        """Деактивирует пользователя (помечает как неактивного)."""
-        async for session in get_session():
-            try:
+    async def deactivate_users(
+        cls, telegram_ids: list[int], session: AsyncSession | None = None
+    ) -> int:
+        """Деактивирует нескольких пользователей одним запросом.
+
+        Args:
+            telegram_ids: ID пользователей
+            session: Сессия unit_of_work (None - отдельная сессия)
+
+        Returns:
+            Количество деактивированных пользователей
+
+        """
+        if not telegram_ids:
+            return 0
+
+        try:
+            async with session_scope(session) as session:
                 result = await session.execute(
-                    update(User).where(User.telegram_id == telegram_id).values(is_active=False)
+                    update(User).where(User.telegram_id.in_(telegram_ids)).values(is_active=False)
                 )
-                await session.commit()
-
-                affected = getattr(result, "rowcount", 0)
-                if affected > 0:
-                    logger.info(f"Деактивирован пользователь: {telegram_id}")
-                    return True
-                logger.warning(f"Пользователь {telegram_id} не найден для деактивации")
-                return False
+            affected = getattr(result, "rowcount", 0)
+            logger.info(f"Деактивировано пользователей: {affected}")
+            return affected
 
-            except Exception as e:
-                await session.rollback()
-                logger.error(f"Ошибка при деактивации пользователя {telegram_id}: {e}")
-                return False
-        return False
+        except Exception as e:
+            logger.error(f"Ошибка при деактивации {len(telegram_ids)} пользователей: {e}")
+            return 0
@@ -0,0 +1,91 @@
+"""Кэш часто читаемых данных пользователей в памяти."""
+
+import logging
+import time
+from collections import OrderedDict
+from typing import Any
+
+from core.config import config
+
+logger = logging.getLogger(__name__)
+
+# Признак отсутствия записи в кэше (None - допустимое значение)
+MISSING = object()
+
+
+class LRUCache:
+    """Ограниченный по размеру LRU кэш с TTL и счётчиками попаданий.
+
+    Хранилища читают через get/set и сбрасывают запись при каждом изменении
+    данных, поэтому TTL лишь ограничивает устаревание при правках в БД в
+    обход бота.
+    """
+
+    def __init__(self, name: str, max_size: int, ttl: float) -> None:
+        """Инициализирует кэш.
+
+        Args:
+            name: Название кэша для логов
+            max_size: Максимальное количество записей
+            ttl: Время жизни записи в секундах
+
+        """
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Any) -> Any:
+        """Возвращает значение или MISSING, если записи нет или она истекла."""
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Any, value: Any) -> None:
+        """Сохраняет значение, вытесняя самые давно использованные записи."""
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Any) -> None:
+        """Удаляет запись."""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Удаляет все записи."""
+        self._data.clear()
+
+    def stats(self) -> dict[str, float]:
+        """Возвращает размер кэша, попадания, промахи и долю попаданий."""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+token_cache = LRUCache("tokens", config.storage_cache_size, config.storage_cache_ttl_seconds)
+settings_cache = LRUCache(
+    "alert_settings", config.storage_cache_size, config.storage_cache_ttl_seconds
+)
+
+
+def log_cache_stats() -> None:
+    """Пишет в лог статистику кэшей хранилищ."""
+    for cache in (token_cache, settings_cache):
+        stats = cache.stats()
+        logger.info(
+            f"Кэш {cache.name}: записей={stats['size']}, попаданий={stats['hits']}, "
+            f"промахов={stats['misses']}, hit rate={stats['hit_rate']:.0%}"
+        )
@@ -0,0 +1,73 @@
+"""Горячие запросы чтения напрямую через asyncpg.
+
+Схема по-прежнему описывается ORM моделями: таблицы и колонки берутся из
+них, а запросы выполняются на соединении пула SQLAlchemy без построения и
+компиляции select и без ORM обработки результата. asyncpg подготавливает
+каждый запрос один раз на соединение и дальше берёт prepared statement из
+своего кэша.
+"""
+
+from collections.abc import Sequence
+from typing import Any
+
+from core.database import db_manager
+from models.alerts import BondLatestPrice, UserAlertSettings
+from models.user import User
+from sqlalchemy import Table
+
+
+def _columns(table: Table) -> str:
+    """Возвращает список колонок таблицы для SELECT."""
+    return ", ".join(f'"{column.name}"' for column in table.columns)
+
+
+_users = User.__table__
+_settings = UserAlertSettings.__table__
+_latest = BondLatestPrice.__table__
+
+TOKEN_SQL = f'SELECT tinvest_token FROM "{_users.name}" WHERE telegram_id = $1'
+SETTINGS_SQL = f'SELECT {_columns(_settings)} FROM "{_settings.name}" WHERE telegram_id = $1'
+LATEST_PRICES_SQL = f'SELECT {_columns(_latest)} FROM "{_latest.name}"'
+LATEST_PRICES_BY_FIGI_SQL = f"{LATEST_PRICES_SQL} WHERE figi = ANY($1::text[])"
+
+
+class FastQueries:
+    """Запросы чтения для горячих путей хранилищ.
+
+    Ошибки не перехватываются: их обрабатывают вызывающие методы хранилищ.
+    Возвращаемые ORM объекты не привязаны к сессии.
+    """
+
+    @classmethod
+    async def get_token(cls, telegram_id: int) -> str | None:
+        """Возвращает токен пользователя."""
+        return await cls._fetch("fetchval", TOKEN_SQL, telegram_id)
+
+    @classmethod
+    async def get_user_settings(cls, telegram_id: int) -> UserAlertSettings | None:
+        """Возвращает настройки уведомлений пользователя."""
+        record = await cls._fetch("fetchrow", SETTINGS_SQL, telegram_id)
+        return UserAlertSettings(**record) if record else None
+
+    @classmethod
+    async def get_latest_prices(
+        cls, figis: Sequence[str] | None = None
+    ) -> dict[str, BondLatestPrice]:
+        """Возвращает последние рыночные цены облигаций по figi.
+
+        Args:
+            figis: FIGI облигаций (None - все сохранённые)
+
+        """
+        if figis is None:
+            records = await cls._fetch("fetch", LATEST_PRICES_SQL)
+        else:
+            records = await cls._fetch("fetch", LATEST_PRICES_BY_FIGI_SQL, list(figis))
+        return {record["figi"]: BondLatestPrice(**record) for record in records}
+
+    @staticmethod
+    async def _fetch(method: str, sql: str, *args: Any) -> Any:
+        """Выполняет запрос методом asyncpg на соединении из пула движка."""
+        async with db_manager.engine.connect() as conn:
+            raw = await conn.get_raw_connection()
+            return await getattr(raw.driver_connection, method)(sql, *args)
@@ -0,0 +1,199 @@
+"""Модуль для хранения справочных данных по инструментам."""
+
+import logging
+from datetime import datetime
+
+from core.database import get_session
+from models.instruments import BondCatalogEntry, BondEventsCacheEntry
+from sqlalchemy import Integer, String, column, delete, insert, select, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentStorage:
+    """Класс для управления справочником облигаций и кэшем событий по ним."""
+
+    @classmethod
+    async def get_bond_catalog(cls) -> list[BondCatalogEntry]:
+        """Возвращает сохранённый снимок справочника облигаций."""
+        async for session in get_session():
+            try:
+                result = await session.execute(select(BondCatalogEntry))
+                return list(result.scalars().all())
+            except Exception as e:
+                logger.error(f"Ошибка при загрузке справочника облигаций: {e}")
+                return []
+        return []
+
+    @classmethod
+    async def replace_bond_catalog(cls, bonds: list[dict]) -> bool:
+        """Заменяет снимок справочника облигаций одной транзакцией.
+
+        Args:
+            bonds: Список словарей с полями модели BondCatalogEntry
+
+        Returns:
+            True если успешно, False иначе
+
+        """
+        async for session in get_session():
+            try:
+                await session.execute(delete(BondCatalogEntry))
+                if bonds:
+                    await session.execute(insert(BondCatalogEntry), bonds)
+                await session.commit()
+                logger.info(f"Сохранён снимок справочника: {len(bonds)} облигаций")
+                return True
+            except Exception as e:
+                await session.rollback()
+                logger.error(f"Ошибка при сохранении справочника облигаций: {e}")
+                return False
+        return False
+
+    # === Кэш событий по облигациям ===
+
+    @classmethod
+    async def get_bond_events(
+        cls, figis: list[str], event_type: str, window_days: int, fetched_after: datetime
+    ) -> list[BondEventsCacheEntry]:
+        """Возвращает закэшированные события для списка figi, загруженные не раньше fetched_after."""
+        async for session in get_session():
+            try:
+                result = await session.execute(
+                    select(BondEventsCacheEntry).where(
+                        BondEventsCacheEntry.figi.in_(figis),
+                        BondEventsCacheEntry.event_type == event_type,
+                        BondEventsCacheEntry.window_days == window_days,
+                        BondEventsCacheEntry.fetched_at > fetched_after,
+                    )
+                )
+                return list(result.scalars().all())
+            except Exception as e:
+                logger.error(f"Ошибка при получении кэша событий облигаций: {e}")
+                return []
+        return []
+
+    @classmethod
+    async def get_bond_events_keys(cls) -> list[tuple[str, str, int]]:
+        """Возвращает ключи (figi, event_type, window_days) всех записей кэша событий."""
+        async for session in get_session():
+            try:
+                result = await session.execute(
+                    select(
+                        BondEventsCacheEntry.figi,
+                        BondEventsCacheEntry.event_type,
+                        BondEventsCacheEntry.window_days,
+                    )
+                )
+                return [tuple(row) for row in result.all()]
+            except Exception as e:
+                logger.error(f"Ошибка при получении ключей кэша событий облигаций: {e}")
+                return []
+        return []
+
+    @classmethod
+    async def touch_bond_events(
+        cls, keys: set[tuple[str, str, int]], accessed_at: datetime
+    ) -> bool:
+        """Записывает время последнего чтения записей кэша событий.
+
+        Args:
+            keys: Ключи (figi, event_type, window_days) прочитанных записей
+            accessed_at: Время чтения
+
+        Returns:
+            True если успешно, False иначе
+
+        """
+        if not keys:
+            return True
+
+        rows = values(
+            column("figi", String),
+            column("event_type", String),
+            column("window_days", Integer),
+            name="accessed",
+        ).data(list(keys))
+        statement = (
+            update(BondEventsCacheEntry)
+            .where(
+                BondEventsCacheEntry.figi == rows.c.figi,
+                BondEventsCacheEntry.event_type == rows.c.event_type,
+                BondEventsCacheEntry.window_days == rows.c.window_days,
+            )
+            .values(accessed_at=accessed_at)
+        )
+
+        async for session in get_session():
+            try:
+                await session.execute(statement)
+                await session.commit()
+                return True
+            except Exception as e:
+                await session.rollback()
+                logger.error(f"Ошибка при обновлении времени чтения кэша событий: {e}")
+                return False
+        return False
+
+    @classmethod
+    async def delete_idle_bond_events(cls, accessed_before: datetime) -> int:
+        """Удаляет записи кэша событий, которые не читали с accessed_before.
+
+        Returns:
+            Количество удалённых записей
+
+        """
+        async for session in get_session():
+            try:
+                result = await session.execute(
+                    delete(BondEventsCacheEntry).where(
+                        BondEventsCacheEntry.accessed_at < accessed_before
+                    )
+                )
+                await session.commit()
+                return getattr(result, "rowcount", 0)
+            except Exception as e:
+                await session.rollback()
+                logger.error(f"Ошибка при удалении неиспользуемого кэша событий: {e}")
+                return 0
+        return 0
+
+    @classmethod
+    async def save_bond_events(cls, entries: list[dict]) -> bool:
+        """Сохраняет события по облигациям (upsert по figi, event_type, window_days).
+
+        Args:
+            entries: Список словарей с полями модели BondEventsCacheEntry
+
+        Returns:
+            True если успешно, False иначе
+
+        """
+        if not entries:
+            return True
+
+        async for session in get_session():
+            try:
+                stmt = pg_insert(BondEventsCacheEntry).values(entries)
+                await session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[
+                            BondEventsCacheEntry.figi,
+                            BondEventsCacheEntry.event_type,
+                            BondEventsCacheEntry.window_days,
+                        ],
+                        set_={
+                            "events": stmt.excluded.events,
+                            "fetched_at": stmt.excluded.fetched_at,
+                        },
+                    )
+                )
+                await session.commit()
+                logger.debug(f"Сохранено {len(entries)} записей кэша событий облигаций")
+                return True
+            except Exception as e:
+                await session.rollback()
+                logger.error(f"Ошибка при сохранении кэша событий облигаций: {e}")
+                return False
+        return False
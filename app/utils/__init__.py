@@ -2,5 +2,6 @@
 
 from .bot_utils import BotUtils
 from .datetime_utils import DateTimeHelper
+from .loop_monitor import LoopLagMonitor
 
-__all__ = ["DateTimeHelper", "BotUtils"]
+__all__ = ["DateTimeHelper", "BotUtils", "LoopLagMonitor"]
@@ -0,0 +1,74 @@
+"""Мониторинг задержек event loop."""
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """Измеряет, насколько event loop опаздывает с пробуждением корутин.
+
+    Фоновая задача засыпает на interval секунд и замеряет фактическую паузу.
+    Разница - время, на которое loop был занят синхронной работой. Раз в
+    report_interval секунд в лог пишется максимум и среднее за период.
+    """
+
+    def __init__(self, interval: float = 0.1, report_interval: float = 300) -> None:
+        """Инициализирует монитор.
+
+        Args:
+            interval: Период замера в секундах
+            report_interval: Период отчёта в лог в секундах
+
+        """
+        self.interval = interval
+        self.report_interval = report_interval
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.samples = 0
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Запускает фоновый замер."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает фоновый замер."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict[str, float]:
+        """Возвращает максимальную и среднюю задержку (мс) за текущий период."""
+        avg = self.total_lag / self.samples if self.samples else 0.0
+        return {"max_ms": self.max_lag * 1000, "avg_ms": avg * 1000, "samples": self.samples}
+
+    async def _run(self) -> None:
+        """Цикл замеров."""
+        loop = asyncio.get_running_loop()
+        period_start = loop.time()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+
+            self.max_lag = max(self.max_lag, lag)
+            self.total_lag += lag
+            self.samples += 1
+
+            if loop.time() - period_start >= self.report_interval:
+                stats = self.stats()
+                logger.info(
+                    f"Задержка event loop: max={stats['max_ms']:.1f} мс, "
+                    f"avg={stats['avg_ms']:.2f} мс"
+                )
+                self.max_lag = 0.0
+                self.total_lag = 0.0
+                self.samples = 0
+                period_start = loop.time()
@@ -0,0 +1,153 @@
+"""Отправка сообщений в пределах лимитов Telegram Bot API."""
+
+import asyncio
+import logging
+import math
+import time
+from enum import Enum
+from typing import Any
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from core.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class SendResult(Enum):
+    """Итог отправки сообщения."""
+
+    DELIVERED = "delivered"
+    UNDELIVERABLE = "undeliverable"  # бот заблокирован или чат не найден
+    FAILED = "failed"  # повторы исчерпаны или прочая ошибка - чат может быть доступен
+
+
+class TelegramSender:
+    """Отправляет сообщения с общим темпом бота и интервалом на чат.
+
+    Telegram ограничивает бота примерно 30 сообщениями в секунду и примерно
+    одним сообщением в секунду в один чат. Время бота делится на слоты по
+    1 / messages_per_second; сообщение занимает ближайший свободный слот не
+    раньше, чем освободится его чат (через chat_interval после предыдущего
+    сообщения в этот чат). Занятый чат не задерживает сообщения в другие чаты:
+    они занимают более ранние свободные слоты. При ответе 429 (RetryAfter)
+    отправки всего бота приостанавливаются на retry_after секунд.
+    """
+
+    def __init__(
+        self, messages_per_second: float, chat_interval: float, max_retries: int = 3
+    ) -> None:
+        """Инициализирует отправитель.
+
+        Args:
+            messages_per_second: Максимум сообщений бота в секунду
+            chat_interval: Минимальный интервал между сообщениями в один чат (секунды)
+            max_retries: Повторы отправки после RetryAfter и сетевых ошибок
+
+        """
+        self.interval = 1 / messages_per_second
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self._paused_until = 0.0
+        self._next_index = 0
+        self._busy_slots: set[int] = set()
+        self._chat_slots: dict[int | str, float] = {}
+        self._lock = asyncio.Lock()
+
+    async def send(self, bot: Bot, chat_id: int | str, text: str, **kwargs: Any) -> SendResult:
+        """Отправляет сообщение, дождавшись свободного слота.
+
+        Args:
+            bot: Экземпляр бота
+            chat_id: ID чата
+            text: Текст сообщения
+            **kwargs: Параметры bot.send_message (parse_mode и т.п.)
+
+        Returns:
+            Итог отправки: UNDELIVERABLE только если чат недоступен навсегда
+            (бот заблокирован, чат не найден)
+
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._wait_slot(chat_id)
+            try:
+                await bot.send_message(chat_id, text, **kwargs)
+                return SendResult.DELIVERED
+            except TelegramForbiddenError as e:
+                logger.warning(f"Чат {chat_id} недоступен: {e}")
+                return SendResult.UNDELIVERABLE
+            except TelegramBadRequest as e:
+                if "chat not found" in str(e).lower():
+                    logger.warning(f"Чат {chat_id} не найден: {e}")
+                    return SendResult.UNDELIVERABLE
+                logger.error(f"Ошибка отправки в чат {chat_id}: {e}")
+                return SendResult.FAILED
+            except TelegramRetryAfter as e:
+                logger.warning(f"Telegram просит подождать {e.retry_after} с (чат {chat_id})")
+                self._pause(e.retry_after)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logger.warning(f"Сбой отправки в чат {chat_id}, попытка {attempt + 1}: {e}")
+                await asyncio.sleep(2**attempt)
+            except Exception as e:
+                logger.error(f"Ошибка отправки в чат {chat_id}: {e}")
+                return SendResult.FAILED
+
+        logger.error(f"Не удалось отправить сообщение в чат {chat_id}: повторы исчерпаны")
+        return SendResult.FAILED
+
+    async def _wait_slot(self, chat_id: int | str) -> None:
+        """Занимает ближайший свободный слот бота после освобождения чата и ждёт его.
+
+        Слоты нумеруются от начала отсчёта time.monotonic(): до _next_index
+        все слоты заняты или прошли, после него заняты только слоты из
+        _busy_slots (сообщения, ждавшие свой чат).
+        """
+        async with self._lock:
+            now = time.monotonic()
+            current = math.ceil(max(now, self._paused_until) / self.interval)
+            if self._next_index < current:
+                self._next_index = current
+                self._busy_slots = {busy for busy in self._busy_slots if busy >= current}
+                self._skip_busy()
+            index = max(
+                self._next_index, math.ceil(self._chat_slots.get(chat_id, 0.0) / self.interval)
+            )
+            if index == self._next_index:
+                self._next_index += 1
+                self._skip_busy()
+            else:
+                while index in self._busy_slots:
+                    index += 1
+                self._busy_slots.add(index)
+            slot = index * self.interval
+            self._chat_slots[chat_id] = slot + self.chat_interval
+            if len(self._chat_slots) > 10000:
+                self._chat_slots = {
+                    chat: chat_slot
+                    for chat, chat_slot in self._chat_slots.items()
+                    if chat_slot > now
+                }
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def _skip_busy(self) -> None:
+        """Сдвигает _next_index за слоты, уже занятые сообщениями, ждавшими свой чат."""
+        while self._next_index in self._busy_slots:
+            self._busy_slots.remove(self._next_index)
+            self._next_index += 1
+
+    def _pause(self, seconds: float) -> None:
+        """Откладывает свободные слоты бота на seconds секунд вперёд."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+telegram_sender = TelegramSender(
+    messages_per_second=config.telegram_messages_per_second,
+    chat_interval=config.telegram_chat_interval_seconds,
+)
@@ -0,0 +1,128 @@
+"""Ограниченный пул обработчиков для пакетных задач scheduler."""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from collections.abc import Awaitable, Callable, Hashable, Iterable
+from dataclasses import dataclass, field
+from typing import Any, Generic, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class PoolRun(Generic[T]):
+    """Итоги прогона пула."""
+
+    results: list[tuple[T, Any]] = field(default_factory=list)  # (элемент, результат)
+    failed: list[T] = field(default_factory=list)
+    timed_out: list[T] = field(default_factory=list)
+    duration: float = 0.0
+
+    @property
+    def total(self) -> int:
+        """Количество обработанных элементов."""
+        return len(self.results) + len(self.failed) + len(self.timed_out)
+
+    @property
+    def rate(self) -> float:
+        """Элементов в секунду."""
+        return self.total / self.duration if self.duration else 0.0
+
+
+class WorkerPool:
+    """Обрабатывает элементы конкурентно с глобальным лимитом и честностью по ключу.
+
+    Элементы группируются по ключу (например, токену T-Invest API) и выдаются
+    обработчикам по кругу: пользователи одного токена не занимают все места,
+    пока остальные ждут, и одновременно по ключу выполняется не больше
+    per_key_limit обработок - лимит запросов API считается по токену.
+    Каждая обработка ограничена timeout секундами; ошибка или таймаут одного
+    элемента не прерывает прогон.
+    """
+
+    def __init__(
+        self, name: str, concurrency: int, timeout: float, per_key_limit: int = 1
+    ) -> None:
+        """Инициализирует пул.
+
+        Args:
+            name: Название пула для логов
+            concurrency: Максимум одновременных обработок
+            timeout: Ограничение времени обработки одного элемента в секундах
+            per_key_limit: Максимум одновременных обработок с одним ключом
+
+        """
+        self.name = name
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.per_key_limit = per_key_limit
+
+    async def run(
+        self,
+        items: Iterable[T],
+        func: Callable[[T], Awaitable[Any]],
+        key: Callable[[T], Hashable],
+    ) -> PoolRun[T]:
+        """Обрабатывает все элементы и возвращает итоги.
+
+        Args:
+            items: Элементы для обработки
+            func: Обработчик одного элемента
+            key: Ключ честности элемента
+
+        Returns:
+            Результаты, упавшие и не уложившиеся в таймаут элементы
+
+        """
+        queues: OrderedDict[Hashable, deque[T]] = OrderedDict()
+        for item in items:
+            queues.setdefault(key(item), deque()).append(item)
+
+        run: PoolRun[T] = PoolRun()
+        active: dict[Hashable, int] = {}
+        changed = asyncio.Condition()
+        started = time.monotonic()
+
+        def take() -> tuple[Hashable, T] | None:
+            """Берёт элемент первого по кругу ключа со свободным местом."""
+            for item_key, queue in queues.items():
+                if active.get(item_key, 0) < self.per_key_limit:
+                    item = queue.popleft()
+                    if queue:
+                        queues.move_to_end(item_key)
+                    else:
+                        del queues[item_key]
+                    active[item_key] = active.get(item_key, 0) + 1
+                    return item_key, item
+            return None
+
+        async def worker() -> None:
+            while True:
+                async with changed:
+                    while (taken := take()) is None:
+                        if not queues:
+                            return
+                        await changed.wait()
+                item_key, item = taken
+                try:
+                    result = await asyncio.wait_for(func(item), self.timeout)
+                    run.results.append((item, result))
+                except TimeoutError:
+                    logger.warning(f"{self.name}: превышено время обработки {item}")
+                    run.timed_out.append(item)
+                except Exception as e:
+                    logger.error(f"{self.name}: ошибка обработки {item}: {e}")
+                    run.failed.append(item)
+                finally:
+                    async with changed:
+                        active[item_key] -= 1
+                        changed.notify_all()
+
+        workers = min(self.concurrency, sum(len(queue) for queue in queues.values()))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        run.duration = time.monotonic() - started
+        return run
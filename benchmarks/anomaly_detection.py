@@ -0,0 +1,99 @@
+"""Бенчмарк поиска аномалий цен по всем пользователям.
+
+Сравнивает построчный расчёт по каждому пользователю (эталон из
+tests/anomaly_reference.py) с detect_anomalies_batch на синтетических
+данных и проверяет, что оба варианта находят одинаковые аномалии. База
+данных не нужна.
+
+Запуск:
+    uv run python benchmarks/anomaly_detection.py [--users 10000] [--bonds 50]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "app"))
+sys.path.insert(0, str(ROOT / "tests"))
+
+from anomaly_reference import detect_per_user  # noqa: E402
+from invest.anomaly_engine import detect_anomalies_batch  # noqa: E402
+from invest.models import Bond  # noqa: E402
+
+
+def make_data(users: int, bonds_per_user: int, universe: int, seed: int) -> dict:
+    """Создаёт синтетические портфели, цены и пороги."""
+    rng = random.Random(seed)
+    figis = [f"BBG00{i:07d}" for i in range(universe)]
+    bonds = {
+        figi: Bond(figi=figi, ticker=f"RU{i:08d}", name=f"Облигация {i}")
+        for i, figi in enumerate(figis)
+    }
+    previous = {figi: rng.uniform(80, 110) for figi in figis}
+    # Большинство цен почти не меняется, часть - заметно; у части бумаг нет прошлой цены
+    current = {figi: price * (1 + rng.gauss(0, 0.005)) for figi, price in previous.items()}
+    for figi in rng.sample(figis, universe // 50):
+        del previous[figi]
+    holdings = {
+        telegram_id: {
+            figi: f"Счёт {telegram_id % 3}" for figi in rng.sample(figis, bonds_per_user)
+        }
+        for telegram_id in range(1, users + 1)
+    }
+    settings = {
+        telegram_id: SimpleNamespace(
+            drop_warning_threshold=rng.choice([1.0, 2.0, 3.0]),
+            drop_critical_threshold=rng.choice([4.0, 5.0]),
+            rise_warning_threshold=rng.choice([2.0, 3.0]),
+            rise_critical_threshold=rng.choice([6.0, 7.0]),
+        )
+        for telegram_id in holdings
+    }
+    return {
+        "holdings": holdings,
+        "settings": settings,
+        "current_prices": current,
+        "previous_prices": previous,
+        "bonds": bonds,
+    }
+
+
+def bench(name: str, func, repeat: int) -> dict:
+    """Печатает лучшее время из repeat запусков и возвращает результат."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    print(f"{name:<22} {min(timings) * 1000:9.1f} ms")
+    return result
+
+
+def main() -> None:
+    """Точка входа бенчмарка."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--bonds", type=int, default=50, help="облигаций у пользователя")
+    parser.add_argument("--universe", type=int, default=3000, help="всего облигаций")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    data = make_data(args.users, args.bonds, args.universe, args.seed)
+    print(f"Pairs: {args.users * args.bonds:,} ({args.users} users x {args.bonds} bonds)\n")
+
+    expected = bench("per-user", lambda: detect_per_user(**data), args.repeat)
+    result = bench("batch numpy", lambda: detect_anomalies_batch(**data), args.repeat)
+
+    print(f"\nAnomalies: {sum(len(a) for a in expected.values()):,} у {len(expected):,} users")
+    print(f"Parity: {'OK' if result == expected else 'MISMATCH'}")
+    if result != expected:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Бенчмарк декодирования ответа InstrumentsService/Bonds.
+
+Сравнивает прежний путь (json + BondsResponse(**dict)) с режимами
+invest.decoding на записанном ответе API или, если файл не передан, на
+синтетическом ответе похожей структуры (~50 полей на инструмент, из которых
+models.Bond использует 7). Отдельно измеряется распаковка готовой модели из
+pickle - эту часть при пуле процессов выполняет основной процесс.
+
+Запуск:
+    uv run python benchmarks/decode_bonds.py [path/to/bonds.json] [--repeat 5]
+
+Записать реальный ответ можно так:
+    curl -s -X POST -H "Authorization: Bearer $TOKEN" -H "Content-Type: application/json" \
+        -d '{"instrumentStatus": "INSTRUMENT_STATUS_BASE"}' \
+        https://invest-public-api.tinkoff.ru/rest/tinkoff.public.invest.api.contract.v1.InstrumentsService/Bonds \
+        > bonds.json
+"""
+
+import argparse
+import json
+import pickle
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from invest.decoding import (  # noqa: E402
+    BACKEND_JSON,
+    BACKEND_ORJSON,
+    BACKEND_PYDANTIC,
+    decode_response,
+    orjson,
+)
+from invest.models import BondsResponse  # noqa: E402
+
+
+def make_instrument(i: int) -> dict:
+    """Создаёт инструмент с полным набором полей, как у реального API."""
+    money = {"currency": "rub", "units": "1000", "nano": 0}
+    quotation = {"units": "0", "nano": 250000000}
+    return {
+        "figi": f"BBG00{i:07d}",
+        "ticker": f"RU000A{i:06d}",
+        "classCode": "TQCB",
+        "isin": f"RU000A{i:06d}",
+        "lot": 1,
+        "currency": "rub",
+        "klong": quotation,
+        "kshort": quotation,
+        "dlong": quotation,
+        "dshort": quotation,
+        "dlongMin": quotation,
+        "dshortMin": quotation,
+        "shortEnabledFlag": False,
+        "name": f"Облигация эмитента {i} выпуск 001P-{i % 30:02d}",
+        "exchange": "MOEX",
+        "couponQuantityPerYear": 12,
+        "maturityDate": "2030-06-15T00:00:00Z",
+        "nominal": money,
+        "initialNominal": money,
+        "stateRegDate": "2024-06-15T00:00:00Z",
+        "placementDate": "2024-06-20T00:00:00Z",
+        "placementPrice": money,
+        "aciValue": {"currency": "rub", "units": "12", "nano": 340000000},
+        "countryOfRisk": "RU",
+        "countryOfRiskName": "Российская Федерация",
+        "sector": "corporate",
+        "issueKind": "documentary",
+        "issueSize": "5000000",
+        "issueSizePlan": "5000000",
+        "tradingStatus": "SECURITY_TRADING_STATUS_NORMAL_TRADING",
+        "otcFlag": False,
+        "buyAvailableFlag": True,
+        "sellAvailableFlag": True,
+        "floatingCouponFlag": i % 5 == 0,
+        "perpetualFlag": False,
+        "amortizationFlag": i % 7 == 0,
+        "minPriceIncrement": {"units": "0", "nano": 10000000},
+        "apiTradeAvailableFlag": True,
+        "uid": f"00000000-0000-0000-0000-{i:012d}",
+        "realExchange": "REAL_EXCHANGE_MOEX",
+        "positionUid": f"11111111-0000-0000-0000-{i:012d}",
+        "assetUid": f"22222222-0000-0000-0000-{i:012d}",
+        "forIisFlag": True,
+        "forQualInvestorFlag": i % 3 == 0,
+        "weekendFlag": False,
+        "blockedTcaFlag": False,
+        "subordinatedFlag": False,
+        "liquidityFlag": True,
+        "first1minCandleDate": "2024-06-20T07:00:00Z",
+        "first1dayCandleDate": "2024-06-20T07:00:00Z",
+        "riskLevel": "RISK_LEVEL_MODERATE",
+        "bondType": "BOND_TYPE_UNSPECIFIED",
+    }
+
+
+def make_synthetic_payload(count: int) -> bytes:
+    """Создаёт синтетический ответ Bonds."""
+    instruments = [make_instrument(i) for i in range(count)]
+    return json.dumps({"instruments": instruments}).encode()
+
+
+def bench(name: str, func, repeat: int) -> None:
+    """Измеряет лучшее время из repeat запусков."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    count = len(result.instruments)
+    best = min(timings)
+    print(f"{name:<24} {best * 1000:8.1f} ms   {count / best:12,.0f} bonds/s")
+
+
+def main() -> None:
+    """Точка входа бенчмарка."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("payload", nargs="?", help="Записанный ответ Bonds (JSON)")
+    parser.add_argument("--count", type=int, default=5000, help="Размер синтетического ответа")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.payload:
+        raw = Path(args.payload).read_bytes()
+        source = args.payload
+    else:
+        raw = make_synthetic_payload(args.count)
+        source = f"synthetic ({args.count} bonds)"
+    print(f"Payload: {source}, {len(raw) / 1024 / 1024:.1f} MiB\n")
+
+    bench(
+        "dict + BondsResponse(**)",
+        lambda: BondsResponse(**json.loads(raw)),
+        args.repeat,
+    )
+    bench(
+        "json + model_validate",
+        lambda: decode_response(raw, BondsResponse, BACKEND_JSON),
+        args.repeat,
+    )
+    bench(
+        "model_validate_json",
+        lambda: decode_response(raw, BondsResponse, BACKEND_PYDANTIC),
+        args.repeat,
+    )
+    if orjson is not None:
+        bench(
+            "orjson + model_validate",
+            lambda: decode_response(raw, BondsResponse, BACKEND_ORJSON),
+            args.repeat,
+        )
+    else:
+        print("orjson не установлен, режим пропущен")
+
+    pickled = pickle.dumps(decode_response(raw, BondsResponse, BACKEND_PYDANTIC))
+    bench("unpickle (process pool)", lambda: pickle.loads(pickled), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Бенчмарк записи истории цен облигаций.
+
+Сравнивает прежний путь (ORM объект BondPriceHistory на каждую строку),
+AlertStorage.save_market_prices (один INSERT через executemany) и, для
+справки, COPY через asyncpg. Пишет во временную таблицу той же структуры,
+что и bond_price_history, в базе из DATABASE_URL.
+
+Запуск:
+    uv run python benchmarks/save_price_snapshot.py [--bonds 12000] [--repeat 3]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from core.database import db_manager  # noqa: E402
+from models.alerts import BondPriceHistory  # noqa: E402
+from sqlalchemy import insert, text  # noqa: E402
+
+BENCH_TABLE = "bond_price_history_bench"
+
+
+def make_rows(bonds: int) -> list[dict]:
+    """Создаёт синтетические цены bonds облигаций."""
+    return [
+        {
+            "figi": f"BBG00{i:07d}",
+            "ticker": f"RU000A{i:06d}",
+            "name": f"Облигация {i}",
+            "price_percent": 95.0 + i % 10 * 0.37,
+        }
+        for i in range(bonds)
+    ]
+
+
+async def write_orm(rows: list[dict]) -> None:
+    """Прежний путь: ORM объект на строку и flush через unit of work."""
+    async with db_manager.session_factory() as session:
+        session.add_all(BondPriceHistory(**row) for row in rows)
+        await session.commit()
+
+
+async def write_executemany(rows: list[dict]) -> None:
+    """Новый путь: один INSERT с executemany."""
+    async with db_manager.session_factory() as session:
+        await session.execute(insert(BondPriceHistory), rows)
+        await session.commit()
+
+
+async def write_copy(rows: list[dict]) -> None:
+    """COPY через asyncpg (для сравнения)."""
+    columns = ["figi", "ticker", "name", "price_percent"]
+    records = [tuple(row[column] for column in columns) for row in rows]
+    async with db_manager.engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            BENCH_TABLE, records=records, columns=columns
+        )
+        await conn.commit()
+
+
+async def bench(name: str, func, rows: list[dict], repeat: int) -> None:
+    """Измеряет лучшее время из repeat запусков на пустой таблице."""
+    timings = []
+    for _ in range(repeat):
+        async with db_manager.engine.begin() as conn:
+            await conn.execute(text(f"TRUNCATE {BENCH_TABLE}"))
+        started = time.perf_counter()
+        await func(rows)
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    print(f"{name:<20} {best * 1000:9.1f} ms   {len(rows) / best:12,.0f} rows/s")
+
+
+async def main() -> None:
+    """Точка входа бенчмарка."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--bonds", type=int, default=12000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = make_rows(args.bonds)
+    print(f"Rows: {len(rows)}\n")
+
+    # Временная таблица вместо рабочей: модель на время бенчмарка смотрит в неё
+    table = BondPriceHistory.__table__
+    original_name = table.name
+    async with db_manager.engine.begin() as conn:
+        await conn.execute(
+            text(f"CREATE TABLE IF NOT EXISTS {BENCH_TABLE} (LIKE {original_name} INCLUDING ALL)")
+        )
+    table.name = BENCH_TABLE
+    try:
+        await bench("ORM add_all", write_orm, rows, args.repeat)
+        await bench("insert executemany", write_executemany, rows, args.repeat)
+        await bench("asyncpg COPY", write_copy, rows, args.repeat)
+    finally:
+        table.name = original_name
+        async with db_manager.engine.begin() as conn:
+            await conn.execute(text(f"DROP TABLE IF EXISTS {BENCH_TABLE}"))
+        await db_manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+"""Бенчмарк горячих запросов чтения: ORM select против FastQueries.
+
+ORM вариант повторяет прежний путь хранилищ (сессия на вызов, построение
+select, ORM обработка результата), FastQueries - prepared statements asyncpg
+на соединении пула. Кэши хранилищ не участвуют. Для запросов берутся
+существующие строки из базы DATABASE_URL; таблицы должны быть созданы.
+
+Запуск:
+    uv run python benchmarks/storage_queries.py [--calls 2000]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from core.database import db_manager  # noqa: E402
+from models.alerts import BondLatestPrice, UserAlertSettings  # noqa: E402
+from models.user import User  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+from storage.fast_queries import FastQueries  # noqa: E402
+
+
+async def orm_token(telegram_id: int, _figi: str) -> None:
+    """Токен пользователя через ORM."""
+    async with db_manager.session_factory() as session:
+        result = await session.execute(
+            select(User.tinvest_token).where(User.telegram_id == telegram_id)
+        )
+        result.scalar_one_or_none()
+
+
+async def orm_settings(telegram_id: int, _figi: str) -> None:
+    """Настройки уведомлений через ORM."""
+    async with db_manager.session_factory() as session:
+        result = await session.execute(
+            select(UserAlertSettings).where(UserAlertSettings.telegram_id == telegram_id)
+        )
+        result.scalar_one_or_none()
+
+
+async def orm_latest_prices(_telegram_id: int, figi: str) -> None:
+    """Последние цены через ORM."""
+    async with db_manager.session_factory() as session:
+        result = await session.execute(
+            select(BondLatestPrice).where(BondLatestPrice.figi.in_([figi]))
+        )
+        {price.figi: price for price in result.scalars()}
+
+
+async def fast_token(telegram_id: int, _figi: str) -> None:
+    """Токен пользователя через FastQueries."""
+    await FastQueries.get_token(telegram_id)
+
+
+async def fast_settings(telegram_id: int, _figi: str) -> None:
+    """Настройки уведомлений через FastQueries."""
+    await FastQueries.get_user_settings(telegram_id)
+
+
+async def fast_latest_prices(_telegram_id: int, figi: str) -> None:
+    """Последние цены через FastQueries."""
+    await FastQueries.get_latest_prices([figi])
+
+
+QUERIES = [
+    ("token", orm_token, fast_token),
+    ("settings", orm_settings, fast_settings),
+    ("latest prices", orm_latest_prices, fast_latest_prices),
+]
+
+
+async def measure(func, telegram_id: int, figi: str, calls: int) -> list[float]:
+    """Возвращает задержки calls последовательных вызовов в микросекундах."""
+    # Прогрев: подготовка запросов и соединения пула
+    for _ in range(20):
+        await func(telegram_id, figi)
+    timings = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        await func(telegram_id, figi)
+        timings.append((time.perf_counter() - started) * 1e6)
+    return timings
+
+
+def describe(timings: list[float]) -> str:
+    """Форматирует медиану и p95."""
+    p95 = statistics.quantiles(timings, n=20)[-1]
+    return f"p50 {statistics.median(timings):7.0f} us  p95 {p95:7.0f} us"
+
+
+async def main() -> None:
+    """Точка входа бенчмарка."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    async with db_manager.session_factory() as session:
+        telegram_id = await session.scalar(select(User.telegram_id).limit(1)) or 0
+        figi = await session.scalar(select(BondLatestPrice.figi).limit(1)) or ""
+    print(f"telegram_id={telegram_id} figi={figi!r} calls={args.calls}\n")
+
+    try:
+        for name, orm_func, fast_func in QUERIES:
+            orm = await measure(orm_func, telegram_id, figi, args.calls)
+            fast = await measure(fast_func, telegram_id, figi, args.calls)
+            speedup = statistics.median(orm) / statistics.median(fast)
+            print(f"{name:<14} ORM   {describe(orm)}")
+            print(f"{'':<14} fast  {describe(fast)}   x{speedup:.1f}")
+    finally:
+        await db_manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""Построчный поиск аномалий цен - эталон для detect_anomalies_batch.
+
+Каждая облигация каждого пользователя сравнивается с базовой ценой его
+детектора по отдельности. Используется в тестах и в
+benchmarks/anomaly_detection.py.
+"""
+
+from collections.abc import Mapping
+
+from invest.models import Bond
+from invest.price_monitor import AlertType, DetectorType, PriceAnomaly
+
+
+def classify_change(change_percent: float, settings) -> AlertType | None:
+    """Определяет тип алерта по изменению цены и порогам пользователя."""
+    if change_percent < 0:
+        drop = abs(change_percent)
+        if drop >= settings.drop_critical_threshold:
+            return AlertType.DROP_CRITICAL
+        if drop >= settings.drop_warning_threshold:
+            return AlertType.DROP_WARNING
+    elif change_percent > 0:
+        if change_percent >= settings.rise_critical_threshold:
+            return AlertType.RISE_CRITICAL
+        if change_percent >= settings.rise_warning_threshold:
+            return AlertType.RISE_WARNING
+    return None
+
+
+def detect_per_user(
+    holdings: Mapping[int, Mapping[str, str]],
+    settings: Mapping[int, object],
+    current_prices: Mapping[str, float],
+    previous_prices: Mapping[str, float],
+    bonds: Mapping[str, Bond],
+    baselines: Mapping[str, Mapping[str, float]] | None = None,
+) -> dict[int, list[PriceAnomaly]]:
+    """Находит аномалии цен у всех пользователей по одной облигации за раз.
+
+    Аргументы и результат - как у detect_anomalies_batch.
+    """
+    baselines = {DetectorType.SNAPSHOT.value: previous_prices, **(baselines or {})}
+    result: dict[int, list[PriceAnomaly]] = {}
+    for telegram_id, user_holdings in holdings.items():
+        user_settings = settings.get(telegram_id)
+        if user_settings is None:
+            continue
+        detector = getattr(user_settings, "detector", None) or DetectorType.SNAPSHOT.value
+        user_baselines = baselines.get(detector, {})
+
+        anomalies = []
+        for figi, account_name in user_holdings.items():
+            old_price = user_baselines.get(figi)
+            if figi not in current_prices or figi not in bonds or not old_price:
+                continue
+            new_price = current_prices[figi]
+            change_percent = ((new_price - old_price) / old_price) * 100
+            alert_type = classify_change(change_percent, user_settings)
+            if alert_type:
+                anomalies.append(
+                    PriceAnomaly(
+                        figi=figi,
+                        ticker=bonds[figi].ticker,
+                        name=bonds[figi].name,
+                        old_price=old_price,
+                        new_price=new_price,
+                        change_percent=change_percent,
+                        alert_type=alert_type,
+                        account_name=account_name,
+                    )
+                )
+        if anomalies:
+            result[telegram_id] = anomalies
+    return result
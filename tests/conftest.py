@@ -0,0 +1,8 @@
+"""Общие настройки тестов: код бота импортируется из app/."""
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+os.environ.setdefault("BOT_TOKEN", "0:test")
@@ -0,0 +1,128 @@
+"""Совпадение detect_anomalies_batch с построчным расчётом."""
+
+import random
+from types import SimpleNamespace
+
+import pytest
+from anomaly_reference import detect_per_user
+from invest.anomaly_engine import detect_anomalies_batch
+from invest.models import Bond
+from invest.price_monitor import AlertType, DetectorType
+
+FIGIS = [f"BBG00{i:07d}" for i in range(40)]
+BONDS = {figi: Bond(figi=figi, ticker=f"RU{i:08d}", name=f"Облигация {i}") for i, figi in enumerate(FIGIS)}
+
+
+def make_settings(detector: str | None = None, **thresholds: float) -> SimpleNamespace:
+    """Настройки уведомлений с порогами по умолчанию."""
+    values = {
+        "drop_warning_threshold": 2.0,
+        "drop_critical_threshold": 5.0,
+        "rise_warning_threshold": 3.0,
+        "rise_critical_threshold": 7.0,
+        "detector": detector,
+    }
+    values.update(thresholds)
+    return SimpleNamespace(**values)
+
+
+def detect_both(**data):
+    """Запускает оба расчёта и проверяет, что результаты совпадают."""
+    expected = detect_per_user(**data)
+    assert detect_anomalies_batch(**data) == expected
+    return expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_parity_random(seed):
+    rng = random.Random(seed)
+    previous = {figi: rng.uniform(80, 110) for figi in FIGIS}
+    current = {figi: price * (1 + rng.gauss(0, 0.04)) for figi, price in previous.items()}
+    for figi in rng.sample(FIGIS, 5):
+        del previous[figi]
+    previous[FIGIS[0]] = 0.0
+    baselines = {
+        DetectorType.EWMA.value: {figi: rng.uniform(80, 110) for figi in rng.sample(FIGIS, 30)},
+        DetectorType.ZSCORE.value: {figi: rng.uniform(80, 110) for figi in rng.sample(FIGIS, 10)},
+    }
+    detectors = [None, "snapshot", "ewma", "zscore", "unknown"]
+    holdings = {
+        telegram_id: {figi: f"Счёт {telegram_id % 3}" for figi in rng.sample(FIGIS, rng.randint(0, 15))}
+        for telegram_id in range(1, 60)
+    }
+    settings = {
+        telegram_id: make_settings(
+            rng.choice(detectors),
+            drop_warning_threshold=rng.choice([1.0, 2.0, 3.0]),
+            drop_critical_threshold=rng.choice([4.0, 5.0]),
+        )
+        for telegram_id in holdings
+    }
+
+    expected = detect_both(
+        holdings=holdings,
+        settings=settings,
+        current_prices=current,
+        previous_prices=previous,
+        bonds=BONDS,
+        baselines=baselines,
+    )
+    assert expected
+
+
+def test_zero_and_missing_previous_price():
+    figi_zero, figi_missing, figi_drop = FIGIS[:3]
+    result = detect_both(
+        holdings={1: {figi_zero: "ИИС", figi_missing: "ИИС", figi_drop: "ИИС"}},
+        settings={1: make_settings()},
+        current_prices={figi_zero: 90.0, figi_missing: 90.0, figi_drop: 90.0},
+        previous_prices={figi_zero: 0.0, figi_drop: 100.0},
+        bonds=BONDS,
+    )
+    assert [(a.figi, a.alert_type) for a in result[1]] == [(figi_drop, AlertType.DROP_CRITICAL)]
+
+
+def test_unknown_detector():
+    figi = FIGIS[0]
+    result = detect_both(
+        holdings={1: {figi: "ИИС"}},
+        settings={1: make_settings("unknown")},
+        current_prices={figi: 90.0},
+        previous_prices={figi: 100.0},
+        bonds=BONDS,
+    )
+    assert result == {}
+
+
+def test_empty_holdings():
+    assert detect_both(
+        holdings={},
+        settings={1: make_settings()},
+        current_prices={FIGIS[0]: 90.0},
+        previous_prices={FIGIS[0]: 100.0},
+        bonds=BONDS,
+    ) == {}
+    assert detect_both(
+        holdings={1: {}},
+        settings={1: make_settings()},
+        current_prices={FIGIS[0]: 90.0},
+        previous_prices={FIGIS[0]: 100.0},
+        bonds=BONDS,
+    ) == {}
+
+
+@pytest.mark.parametrize("detector", [DetectorType.EWMA.value, DetectorType.ZSCORE.value])
+def test_detector_baselines(detector):
+    figi = FIGIS[0]
+    result = detect_both(
+        holdings={1: {figi: "ИИС"}, 2: {figi: "Брокерский"}},
+        settings={1: make_settings(detector), 2: make_settings()},
+        current_prices={figi: 104.0},
+        previous_prices={figi: 103.0},
+        bonds=BONDS,
+        baselines={detector: {figi: 100.0}},
+    )
+    # Пользователь 1 сравнивает с базовой ценой детектора, пользователь 2 - с прошлой ценой
+    assert list(result) == [1]
+    assert result[1][0].old_price == 100.0
+    assert result[1][0].alert_type == AlertType.RISE_WARNING
@@ -0,0 +1,35 @@
+"""Скользящая статистика цен и детектор z-score."""
+
+import pytest
+from invest.price_monitor import PriceWindow, ZScoreDetector
+
+
+def filled_window(prices: list[float], size: int = 24) -> PriceWindow:
+    window = PriceWindow(size, alpha=0.2)
+    for price in prices:
+        window.push(price)
+    return window
+
+
+@pytest.mark.parametrize("price", [100.0, 98.123, 101.37])
+def test_flat_window_alerts_on_any_move(price):
+    window = filled_window([price] * 30)
+    assert window.std == 0.0
+    assert ZScoreDetector(min_points=6, z_threshold=2.5).baseline(window, price * 0.9) == pytest.approx(price)
+
+
+def test_std_matches_two_pass():
+    prices = [100 + (i % 5) * 0.1 for i in range(50)]
+    window = filled_window(prices)
+    recent = prices[-24:]
+    mean = sum(recent) / len(recent)
+    expected = (sum((p - mean) ** 2 for p in recent) / len(recent)) ** 0.5
+    assert window.mean == pytest.approx(mean)
+    assert window.std == pytest.approx(expected)
+
+
+def test_zscore_ignores_noise():
+    window = filled_window([100.0 + (i % 2) for i in range(24)])
+    detector = ZScoreDetector(min_points=6, z_threshold=2.5)
+    assert detector.baseline(window, 100.8) is None
+    assert detector.baseline(window, 110.0) == pytest.approx(100.5)